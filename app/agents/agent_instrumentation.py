@@ -195,7 +195,7 @@ def check_instrumentation(instrumented_code: str) -> tuple[bool, str]:
 
     # First pass - collect all block information
     for line_num, line in enumerate(instrumented_code_lines):
-        matches = re.finditer(TRACE_PATTERN, line.strip())
+        matches = TRACE_PATTERN.finditer(line.strip())
         for match in matches:
             action, func_name, bb_id = match.groups()
             block_id = (func_name, int(bb_id))
@@ -298,8 +298,7 @@ def check_instrumentation(instrumented_code: str) -> tuple[bool, str]:
             if action == "update":
                 # Use regex to replace block ID in original line
                 new_block_id = content
-                new_line = re.sub(
-                    TRACE_PATTERN,
+                new_line = TRACE_PATTERN.sub(
                     lambda m: m.group(0).replace(
                         f"{m.group(1)} {m.group(2)} {m.group(3)}",
                         f"{m.group(1)} {new_block_id[0]} {new_block_id[1]}",
@@ -310,8 +309,7 @@ def check_instrumentation(instrumented_code: str) -> tuple[bool, str]:
             elif (
                 action == "delete"
             ):  # when deleting, DO NOT directly delete the line, but replace the instrumentation statements (enter/exit func_name bb_id) with a blank content. This ensures that we don't wrongly change the code logic.
-                new_line = re.sub(
-                    TRACE_PATTERN,
+                new_line = TRACE_PATTERN.sub(
                     lambda m: m.group(0).replace(
                         f"{m.group(1)} {m.group(2)} {m.group(3)}",
                         "",
@@ -334,7 +332,7 @@ def instr_postprocess(instrumented_code: str, mark: str) -> str:
     """
     lines = instrumented_code.split("\n")
     for line_num, line in enumerate(lines):
-        match = re.search(TRACE_PATTERN, line)
+        match = TRACE_PATTERN.search(line)
         if match:
             # extract the matched groups
             action = match.group(1)  # enter or exit
@@ -423,11 +421,11 @@ class InstrumentationAgent:
         )
 
         msg_thread = MessageThread()
-        system_prompt = unescape(
-            Instructions(instructions=FILE_SPLIT_SYSTEM_PROMPT).to_xml().decode()
+        system_prompt = wrap_between_tags(
+            Instructions.__xml_tag__, FILE_SPLIT_SYSTEM_PROMPT
         )
         msg_thread.add_system(system_prompt)
-        user_prompt = unescape(SourceCode(source_code=formatted_code).to_xml().decode())
+        user_prompt = wrap_between_tags(SourceCode.__xml_tag__, formatted_code)
         msg_thread.add_user(user_prompt)
 
         # Define available tools
@@ -589,30 +587,24 @@ class InstrumentationAgent:
             HEADER_SUPPLEMENTAL_REQUIREMENTS if chunk_idx == 0 else "",
         )
         msg_thread.add_system(
-            unescape(
-                (
-                    Instructions(instructions=system_prompt).to_xml()
-                    + b"\n"
-                    + ExampleUserInput(
-                        example_user_input=(
-                            wrap_between_tags(
-                                FilePath.__xml_tag__,
-                                f"{src_example_file} (Part 1/1)",
-                            )
-                            + "\n"
-                            + wrap_between_tags(
-                                SourceCode.__xml_tag__, SOURCE_CODE_EXAMPLE
-                            )
-                        )
-                    ).to_xml()
-                    + b"\n"
-                    + ExampleAssistantOutput(
-                        example_assistant_output=wrap_between_tags(
-                            InstrumentedCode.__xml_tag__,
-                            INSTRUMENTED_CODE_EXAMPLE,
-                        )
-                    ).to_xml()
-                ).decode()
+            wrap_between_tags(Instructions.__xml_tag__, system_prompt)
+            + "\n"
+            + wrap_between_tags(
+                ExampleUserInput.__xml_tag__,
+                wrap_between_tags(
+                    FilePath.__xml_tag__,
+                    f"{src_example_file} (Part 1/1)",
+                )
+                + "\n"
+                + wrap_between_tags(SourceCode.__xml_tag__, SOURCE_CODE_EXAMPLE),
+            )
+            + "\n"
+            + wrap_between_tags(
+                ExampleAssistantOutput.__xml_tag__,
+                wrap_between_tags(
+                    InstrumentedCode.__xml_tag__,
+                    INSTRUMENTED_CODE_EXAMPLE,
+                ),
             )
         )
 
@@ -2,7 +2,7 @@
 This agent solves path constraints using tools (if necessary) and executes the solution
 """
 
-from copy import deepcopy
+from bisect import bisect_right
 from xml.sax.saxutils import unescape
 
 from loguru import logger
@@ -17,6 +17,7 @@ from app.agents.common import (
     SrcTestCaseId,
     TestCaseId,
     parse_tool_arguments,
+    wrap_between_tags,
 )
 from app.agents.tools import (
     SelectionTool,
@@ -69,57 +70,109 @@ Evaluate each test case against the above criteria before making your final sele
 
 SCHEDULING_TEMPERATURE = 0.0
 
+# the system prompt is invariant, so render it only once per process
+RENDERED_SYSTEM_PROMPT = wrap_between_tags(Instructions.__xml_tag__, SYSTEM_PROMPT)
+# the format reminder is also invariant, so it is only unescaped once
+RENDERED_FORMAT_REMINDER = unescape(SCHEDULING_FORMAT_REMINDER)
+
 
 class TestCaseScheduler:
     """Test case scheduler for concolic execution"""
 
     def __init__(self):
-        self.already_cached_tc_ids: set[int] = set()
+        # test case IDs in the cached message thread, in the order they were added
+        self.cached_tc_ids: list[int] = []
+        # number of cached test cases after each user message in the cached thread
+        self.cached_batch_ends: list[int] = []
+        # the system prompt is a prompt-cache breakpoint, and is kept across invalidations
+        self.cached_msg_thread = MessageThread()
+        self.cached_msg_thread.add_system(self._build_system_prompt(), to_cache=True)
+        self.system_prompt_checkpoint = self.cached_msg_thread.checkpoint()
 
     def _build_system_prompt(self) -> str:
         """Build the system prompt for the scheduler"""
-        return unescape(Instructions(instructions=SYSTEM_PROMPT).to_xml().decode())
+        return RENDERED_SYSTEM_PROMPT
 
     def _build_user_prompt(self, provided_tc_info: dict[int, str]) -> str:
         """Build the user prompt for the scheduler"""
 
-        # first, check if we can reuse the cached message thread
-        if len(self.already_cached_tc_ids) > 0 and all(
-            tc_id in provided_tc_info.keys() for tc_id in self.already_cached_tc_ids
-        ):
+        # test cases are always presented in ID order, so that the prompt is deterministic
+        # and the cached message thread can be keyed by the longest common prefix
+        provided_tc_ids = sorted(provided_tc_info)
+
+        cached_tc_cnt = len(self.cached_tc_ids)
+        if provided_tc_ids[:cached_tc_cnt] == self.cached_tc_ids:
+            # common case: all cached test cases are still provided
+            common_tc_cnt = cached_tc_cnt
+        else:
+            common_tc_cnt = 0
+            for cached_tc_id, provided_tc_id in zip(
+                self.cached_tc_ids, provided_tc_ids
+            ):
+                if cached_tc_id != provided_tc_id:
+                    break
+                common_tc_cnt += 1
+        # only whole batches (user messages) can be kept
+        kept_batches = bisect_right(self.cached_batch_ends, common_tc_cnt)
+
+        # first, check if we can reuse (a prefix of) the cached message thread
+        if kept_batches > 0:
+            kept_tc_cnt = self.cached_batch_ends[kept_batches - 1]
             logger.debug(
                 "Reusing cached message thread for test cases: {}",
-                self.already_cached_tc_ids,
+                self.cached_tc_ids[:kept_tc_cnt],
             )
-            new_tc_info = ""
-            new_tc_ids = []
-            for tc_id in provided_tc_info:
-                if tc_id not in self.already_cached_tc_ids:
-                    new_tc_info += provided_tc_info[tc_id] + "\n\n"
-                    new_tc_ids.append(tc_id)
+            if kept_batches < len(self.cached_batch_ends):
+                logger.debug(
+                    "Dropping test cases ({}) from scheduling cache",
+                    self.cached_tc_ids[kept_tc_cnt:],
+                )
+                # system message + the kept user messages
+                del self.cached_msg_thread.messages[kept_batches + 1 :]
+                del self.cached_tc_ids[kept_tc_cnt:]
+                del self.cached_batch_ends[kept_batches:]
+                # the breakpoint was on a dropped message, move it back to the kept prefix
+                self.cached_msg_thread.mark_cache_breakpoint()
+
+            new_tc_ids = provided_tc_ids[kept_tc_cnt:]
             if len(new_tc_ids) > 0:
                 logger.debug(
                     f"Adding new test cases ({new_tc_ids}) information for scheduling cache"
                 )
-                self.already_cached_tc_ids.update(new_tc_ids)
-                self.cached_msg_thread.add_user(new_tc_info)
+                # join once, without a temporary string per test case
+                new_tc_info = (
+                    "\n\n".join([provided_tc_info[tc_id] for tc_id in new_tc_ids])
+                    + "\n\n"
+                )
+                self.cached_tc_ids.extend(new_tc_ids)
+                self.cached_batch_ends.append(len(self.cached_tc_ids))
+                # move the breakpoint to the end of the extended prefix; the provider
+                # still reads the previous breakpoint's prefix from its cache
+                self.cached_msg_thread.add_user(
+                    new_tc_info,
+                    to_cache=True,
+                    clear_pre_cache_role=["user", "tool", "assistant"],
+                )
             else:
                 logger.debug("No new test cases to add to scheduling cache")
         else:
             logger.debug(
                 "Clearing/Initializing scheduling cache, adding test cases: {}",
-                provided_tc_info.keys(),
+                provided_tc_ids,
             )
-            self.already_cached_tc_ids.clear()
-            self.already_cached_tc_ids.update(provided_tc_info.keys())
-            self.cached_msg_thread = MessageThread()
-            self.cached_msg_thread.add_system(self._build_system_prompt())
+            self.cached_tc_ids = list(provided_tc_ids)
+            self.cached_batch_ends = [len(provided_tc_ids)]
+            # keep only the system prompt, the test case block is a new breakpoint
+            self.cached_msg_thread.rollback(self.system_prompt_checkpoint)
+            # join once, instead of prepending the reminder to the joined test cases
             self.cached_msg_thread.add_user(
-                unescape(
-                    SCHEDULING_FORMAT_REMINDER
-                    + "\n\n"
-                    + "\n\n".join(provided_tc_info.values())
-                )
+                "\n\n".join(
+                    [
+                        RENDERED_FORMAT_REMINDER,
+                        *(provided_tc_info[tc_id] for tc_id in provided_tc_ids),
+                    ]
+                ),
+                to_cache=True,
             )
 
     def schedule(
@@ -134,9 +187,30 @@ class TestCaseScheduler:
             - usage_details: usage details for each tool
             - msg_thread: message thread for debugging
         """
+        if len(provided_tc_info) == 1:
+            selected_test_case_id = next(iter(provided_tc_info))
+            logger.info(
+                "Only test case #{} is provided, skipping scheduling",
+                selected_test_case_id,
+            )
+            return selected_test_case_id, init_agent_usage_details(), MessageThread()
+
         self._build_user_prompt(provided_tc_info)
 
-        msg_thread = deepcopy(self.cached_msg_thread)
+        # tool-call turns are appended to the cached thread and rolled back afterwards
+        msg_thread = self.cached_msg_thread
+        checkpoint = msg_thread.checkpoint()
+        try:
+            return self._schedule(provided_tc_info, msg_thread)
+        finally:
+            msg_thread.rollback(checkpoint)
+
+    def _schedule(
+        self,
+        provided_tc_info: dict[int, str],
+        msg_thread: MessageThread,
+    ) -> tuple[int, dict[str, tuple[int, Usage]], MessageThread]:
+        """Run the tool-call loop of the scheduling agent on `msg_thread`"""
 
         # print_selection(user_prompt, "Test Case Scheduling")
 
@@ -146,7 +220,8 @@ class TestCaseScheduler:
         available_tools = [SelectionTool, ThinkingTool]
 
         usage_details: dict[str, tuple[int, Usage]] = init_agent_usage_details()
-        last_call: list[str] = ["INITIAL"]
+        # the input of a turn is attributed to the tools called in the previous turn
+        last_call: tuple[str, ...] = ("INITIAL",)
 
         while selected_test_case_id is None:
             # Call model with tools support
@@ -157,7 +232,14 @@ class TestCaseScheduler:
             )
 
             update_usage_details(usage_details, last_call, get_usage_input_part(usage))
-            last_call = []
+            last_call = (
+                tuple(
+                    tool_call.get("function").get("name")
+                    for tool_call in response_tool_calls
+                )
+                if response_tool_calls
+                else ("non_tool",)
+            )
 
             logger.info(
                 "Scheduling agent response content (being empty is normal when the model calls tools): \n{}",
@@ -174,7 +256,6 @@ class TestCaseScheduler:
                 for tool_call in response_tool_calls:
                     function_name = tool_call.get("function").get("name")
                     tool_call_id = tool_call.get("id")
-                    last_call.append(function_name)
 
                     logger.info(f"Scheduling agent calling tool `{function_name}`")
                     observation = None
@@ -205,14 +286,20 @@ class TestCaseScheduler:
                         clear_pre_cache_role=["tool", "assistant"],
                     )
             else:
+                # never let the reminder take over the test case breakpoints
                 msg_thread.add_user(
-                    "Please use the provided tools to achieve the goal.", to_cache=False
+                    "Please use the provided tools to achieve the goal.",
+                    to_cache=False,
+                    clear_pre_cache_role=["tool", "assistant"],
                 )
-                last_call.append("non_tool")
 
             update_usage_details(usage_details, last_call, get_usage_output_part(usage))
 
         logger.debug("Scheduling process message thread: {}", msg_thread)
 
-        # Return the solution
-        return selected_test_case_id, usage_details, msg_thread
+        # Return the solution (with a snapshot of the thread, as it will be rolled back)
+        return (
+            selected_test_case_id,
+            usage_details,
+            MessageThread(messages=list(msg_thread.messages)),
+        )
@@ -2,8 +2,6 @@
 This agent solves path constraints using tools (if necessary) and executes the solution
 """
 
-from xml.sax.saxutils import unescape
-
 from loguru import logger
 
 from app.agents.common import (
@@ -11,6 +9,7 @@ from app.agents.common import (
     Instructions,
     TargetPathConstraint,
     parse_tool_arguments,
+    wrap_between_tags,
 )
 from app.agents.tools import (
     PythonExecutorTool,
@@ -107,19 +106,15 @@ def solve(
         - msg_thread: message thread for debugging
     """
     msg_thread = MessageThread()
-    system_prompt = unescape(Instructions(instructions=SYSTEM_PROMPT).to_xml().decode())
+    system_prompt = wrap_between_tags(Instructions.__xml_tag__, SYSTEM_PROMPT)
     msg_thread.add_system(system_prompt)
 
-    user_prompt_execution_info = unescape(
-        (
-            ExecutionInformation(execution_information=execution_information).to_xml()
-        ).decode()
+    user_prompt_execution_info = wrap_between_tags(
+        ExecutionInformation.__xml_tag__, execution_information
     )
 
-    user_prompt_target_path_constraint = unescape(
-        (
-            TargetPathConstraint(target_path_constraint=target_path_constraint).to_xml()
-        ).decode()
+    user_prompt_target_path_constraint = wrap_between_tags(
+        TargetPathConstraint.__xml_tag__, target_path_constraint
     )
 
     msg_thread.add_user(user_prompt_execution_info)
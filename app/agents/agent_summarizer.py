@@ -3,7 +3,6 @@ This agent first selects an unexecuted target branch, then summarizes the constr
 """
 
 from collections.abc import Callable, Generator
-from xml.sax.saxutils import unescape
 
 from loguru import logger
 
@@ -460,10 +459,11 @@ def summarize(
 
     msg_thread: MessageThread = MessageThread()
     system_prompt = (
-        Instructions(instructions=SYSTEM_PROMPT).to_xml()
-        + b"\n"
-        + ExampleUserInput(
-            example_user_input=wrap_between_tags(
+        wrap_between_tags(Instructions.__xml_tag__, SYSTEM_PROMPT)
+        + "\n"
+        + wrap_between_tags(
+            ExampleUserInput.__xml_tag__,
+            wrap_between_tags(
                 ExecutionInformation.__xml_tag__, EXECUTION_INFORMATION_EXAMPLE
             )
             + "\n"
@@ -475,12 +475,11 @@ def summarize(
                 + "\n\n"
                 + EXECUTION_TRACE_EXAMPLE,
             )
-            + "\n"
-        ).to_xml()
-        + b"\n"
-        + f"""# Example of Target Branch Selection and Path Constraint Generation:\n{EXAMPLE_TARGET_BRANCH}\n{EXAMPLE_OUTPUT_PATH_CONSTRAINT}""".encode()
-    ).decode()
-    system_prompt = unescape(system_prompt)
+            + "\n",
+        )
+        + "\n"
+        + f"""# Example of Target Branch Selection and Path Constraint Generation:\n{EXAMPLE_TARGET_BRANCH}\n{EXAMPLE_OUTPUT_PATH_CONSTRAINT}"""
+    )
     msg_thread.add_system(system_prompt)
 
     avoid_branches_str = ""
@@ -488,29 +487,27 @@ def summarize(
         for cnt, branch in enumerate(already_selected_branch_but_not_reached):
             avoid_branches_str += f"Branch {cnt+1}: {branch}\n"
 
-    user_prompt = unescape(
-        (
-            ExecutionInformation(execution_information=execution_information).to_xml()
-            + b"\n"
-            + ExecutionTrace(
-                execution_trace=wrap_between_tags(
-                    FunctionCallChain.__xml_tag__, function_call_chain
-                )
-                + "\n\n"
-                + execution_trace
-            ).to_xml()
-            + b"\n"
-            + (
-                (
-                    b"\n"
-                    + AlreadySelectedBranchButNotReached(
-                        already_selected_branch_but_not_reached=avoid_branches_str
-                    ).to_xml()
+    user_prompt = (
+        wrap_between_tags(ExecutionInformation.__xml_tag__, execution_information)
+        + "\n"
+        + wrap_between_tags(
+            ExecutionTrace.__xml_tag__,
+            wrap_between_tags(FunctionCallChain.__xml_tag__, function_call_chain)
+            + "\n\n"
+            + execution_trace,
+        )
+        + "\n"
+        + (
+            (
+                "\n"
+                + wrap_between_tags(
+                    AlreadySelectedBranchButNotReached.__xml_tag__,
+                    avoid_branches_str,
                 )
-                if avoid_branches_str != ""
-                else b""
             )
-        ).decode()
+            if avoid_branches_str != ""
+            else ""
+        )
     )
 
     msg_thread.add_user(user_prompt)
@@ -777,16 +774,14 @@ def review_summary(
         msg_thread: message thread for debugging
     """
 
-    user_prompt = unescape(
-        (
-            Instructions(instructions=REVIEW_SUMMARY_USER_PROMPT).to_xml()
-            + b"\n"
-            + NewExecutionInformation(
-                new_execution_information=new_execution_information
-            ).to_xml()
-            + b"\n"
-            + NewExecutionTrace(new_execution_trace=new_execution_trace).to_xml()
-        ).decode()
+    user_prompt = (
+        wrap_between_tags(Instructions.__xml_tag__, REVIEW_SUMMARY_USER_PROMPT)
+        + "\n"
+        + wrap_between_tags(
+            NewExecutionInformation.__xml_tag__, new_execution_information
+        )
+        + "\n"
+        + wrap_between_tags(NewExecutionTrace.__xml_tag__, new_execution_trace)
     )
 
     msg_thread.add_user(user_prompt)
@@ -1,9 +1,14 @@
+import functools
 import html
 import json
 import re
 
 from loguru import logger
-from pydantic_xml import BaseXmlModel
+
+try:
+    import orjson
+except ImportError:  # optional, only used to speed up parsing tool arguments
+    orjson = None
 
 from app.agents.states import ConcolicExecutionState
 
@@ -11,18 +16,29 @@ MAX_CODE_REQUEST_ATTEMPTS = (
     10  # Maximum allowed number of CodeRequest attempts in summarizer
 )
 # pattern for instrumentation in the code
-TRACE_PATTERN = r".*?(enter|exit)\s+([^\s]+)\s+(\d+).*?"
+TRACE_PATTERN = re.compile(r".*?(enter|exit)\s+([^\s]+)\s+(\d+).*?")
 
-FILE_TRACE_PATTERN = r"\[([^\s\]]+)\]\s+(enter|exit)\s+([^\s]+)\s+(\d+)"  # use re.search or re.findall instead of re.match
+FILE_TRACE_PATTERN = re.compile(
+    r"\[([^\s\]]+)\]\s+(enter|exit)\s+([^\s]+)\s+(\d+)"
+)  # use .search or .findall instead of .match
 # "[no_space_characters]" + "space" + "enter/exit" + "space" + "no_space_characters" + "space" + "number"
 
+# same as FILE_TRACE_PATTERN, but never matches across lines, so it can run on a whole output
+_FILE_TRACE_IN_LINE_RE = re.compile(
+    r"\[([^\s\]]+)\][^\S\n]+(enter|exit)[^\S\n]+([^\s]+)[^\S\n]+(\d+)"
+)
+
 TOTAL_COST_FORMAT = "Total cost: {:.6f}"
 SPLIT_COST_FORMAT_WITH_CHUNKS = "Total split cost: {:.6f}, input tokens: {}, output tokens: {}, cache read tokens: {}, cache write tokens: {}, split chunks: {}"
 INSTRUMENTED_COST_FORMAT = "Total instrumented cost: {:.6f}, input tokens: {}, output tokens: {}, cache read tokens: {}, cache write tokens: {}"
 
-TOTAL_COST_PATTERN = r".*Total cost: ([\d.]+)"
-SPLIT_COST_PATTERN = r"(?i).*Total split cost: ([\d.]+), input tokens: (\d+), output tokens: (\d+)(?:, cache read tokens: (\d+), cache write tokens: (\d+))?.? Split chunks:[\s]*(.+)"
-INSTRUMENTED_COST_PATTERN = r"(?i).*Total instrumented cost: ([\d.]+), input tokens: (\d+), output tokens: (\d+)(?:, cache read tokens: (\d+), cache write tokens: (\d+))?"
+TOTAL_COST_PATTERN = re.compile(r".*Total cost: ([\d.]+)")
+SPLIT_COST_PATTERN = re.compile(
+    r"(?i).*Total split cost: ([\d.]+), input tokens: (\d+), output tokens: (\d+)(?:, cache read tokens: (\d+), cache write tokens: (\d+))?.? Split chunks:[\s]*(.+)"
+)
+INSTRUMENTED_COST_PATTERN = re.compile(
+    r"(?i).*Total instrumented cost: ([\d.]+), input tokens: (\d+), output tokens: (\d+)(?:, cache read tokens: (\d+), cache write tokens: (\d+))?"
+)
 
 
 CONCOLIC_EXECUTION_STATE = None
@@ -38,96 +54,109 @@ def get_concolic_execution_state() -> ConcolicExecutionState:
     return CONCOLIC_EXECUTION_STATE
 
 
-class Instructions(BaseXmlModel, tag="instructions"):
+class XmlTag:
+    """
+    An XML tag used to structure the prompts, with its name in `__xml_tag__`.
+    Use `wrap_between_tags(Tag.__xml_tag__, value)` to render it.
+    """
+
+    __xml_tag__: str
+
+    def __init_subclass__(cls, tag: str, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.__xml_tag__ = tag
+
+
+class Instructions(XmlTag, tag="instructions"):
     instructions: str
 
 
-class ExecutionInformation(BaseXmlModel, tag="execution_information"):
+class ExecutionInformation(XmlTag, tag="execution_information"):
     execution_information: str
 
 
-class SourceCode(BaseXmlModel, tag="source_code"):
+class SourceCode(XmlTag, tag="source_code"):
     source_code: str
 
 
-class FilePath(BaseXmlModel, tag="file_path"):
+class FilePath(XmlTag, tag="file_path"):
     file_path: str
 
 
-class NewExecutionInformation(BaseXmlModel, tag="new_execution_information"):
+class NewExecutionInformation(XmlTag, tag="new_execution_information"):
     new_execution_information: str
 
 
-class NewExecutionTrace(BaseXmlModel, tag="new_execution_trace"):
+class NewExecutionTrace(XmlTag, tag="new_execution_trace"):
     new_execution_trace: str
 
 
-class ExecutionTrace(BaseXmlModel, tag="execution_trace"):
+class ExecutionTrace(XmlTag, tag="execution_trace"):
     execution_trace: str
 
 
-class TargetPathConstraint(BaseXmlModel, tag="target_path_constraint"):
+class TargetPathConstraint(XmlTag, tag="target_path_constraint"):
     target_path_constraint: str
 
 
-class TestCaseInformation(BaseXmlModel, tag="test_case_information"):
+class TestCaseInformation(XmlTag, tag="test_case_information"):
     test_case_information: str
 
 
-class PathConstraint(BaseXmlModel, tag="path_constraint"):
+class PathConstraint(XmlTag, tag="path_constraint"):
     path_constraint: str
 
 
-class TestCaseId(BaseXmlModel, tag="test_case_id"):
+class TestCaseId(XmlTag, tag="test_case_id"):
     test_case_id: str
 
 
-class SrcTestCaseId(BaseXmlModel, tag="src_test_case_id"):
+class SrcTestCaseId(XmlTag, tag="src_test_case_id"):
     src_test_case_id: str
 
 
-class FunctionCallChain(BaseXmlModel, tag="function_call_chain"):
+class FunctionCallChain(XmlTag, tag="function_call_chain"):
     function_call_chain: str
 
 
-class HistoricalInformation(BaseXmlModel, tag="historical_information"):
+class HistoricalInformation(XmlTag, tag="historical_information"):
     historical_information: str
 
 
-class ExampleUserInput(BaseXmlModel, tag="example_user_input"):
+class ExampleUserInput(XmlTag, tag="example_user_input"):
     example_user_input: str
 
 
-class ExampleInstrumentedCode(BaseXmlModel, tag="example_instrumented_code"):
+class ExampleInstrumentedCode(XmlTag, tag="example_instrumented_code"):
     example_instrumented_code: str
 
 
-class InstrumentedCode(BaseXmlModel, tag="instrumented_code"):
+class InstrumentedCode(XmlTag, tag="instrumented_code"):
     instrumented_code: str
 
 
-class FunctionInfo(BaseXmlModel, tag="function_info"):
+class FunctionInfo(XmlTag, tag="function_info"):
     function_info: str
 
 
-class ExampleAssistantOutput(BaseXmlModel, tag="example_assistant_output"):
+class ExampleAssistantOutput(XmlTag, tag="example_assistant_output"):
     example_assistant_output: str
 
 
-class SourceCodeToInstrument(BaseXmlModel, tag="source_code_to_instrument"):
+class SourceCodeToInstrument(XmlTag, tag="source_code_to_instrument"):
     source_code_to_instrument: str
 
 
-class UpdatedCode(BaseXmlModel, tag="updated_code"):
+class UpdatedCode(XmlTag, tag="updated_code"):
     updated_code: str
 
 
-class TargetBranch(BaseXmlModel, tag="target_branch"):
+class TargetBranch(XmlTag, tag="target_branch"):
     target_branch: str
 
 
 class AlreadySelectedBranchButNotReached(
-    BaseXmlModel, tag="already_selected_branch_but_not_reached"
+    XmlTag, tag="already_selected_branch_but_not_reached"
 ):
     already_selected_branch_but_not_reached: str
 
@@ -136,6 +165,11 @@ class ResponseParseException(Exception):
     pass
 
 
+@functools.lru_cache(maxsize=None)
+def _tag_re(tag: str) -> re.Pattern:
+    return re.compile(f"<{tag}>(.+?)</{tag}>", re.DOTALL)
+
+
 def extract_between_tags(
     tag: str, string: str, strip: bool = False, use_unescape: bool = True
 ) -> list[str]:
@@ -145,7 +179,7 @@ def extract_between_tags(
     if use_unescape:
         string = html.unescape(string)
 
-    ext_list = re.findall(f"<{tag}>(.+?)</{tag}>", string, re.DOTALL)
+    ext_list = _tag_re(tag).findall(string)
     if strip:
         ext_list = [e.strip() for e in ext_list]
     if len(ext_list) == 0:
@@ -154,13 +188,11 @@ def extract_between_tags(
 
 
 def filter_instr_print(stderr_str: str) -> str:
-    filtered_stderr = ""
-    for line in stderr_str.split("\n"):
-        # replace FILE_TRACE_PATTERN with ""
-        line = re.sub(FILE_TRACE_PATTERN, "", line.strip())
-        if line.strip():
-            filtered_stderr += line + "\n"
-    return filtered_stderr
+    # strip each line, replace FILE_TRACE_PATTERN with "" in one pass, then drop
+    # the blank lines; the whitespace around a removed trace is kept
+    stderr_str = "\n".join(map(str.strip, stderr_str.split("\n")))
+    stderr_str = _FILE_TRACE_IN_LINE_RE.sub("", stderr_str)
+    return "".join(line + "\n" for line in stderr_str.split("\n") if line.strip())
 
 
 def wrap_between_tags(tag: str, string: str) -> str:
@@ -172,6 +204,11 @@ def parse_tool_arguments(tool_call: dict) -> dict:
     args = tool_call.get("function", {}).get("arguments", {})
     if isinstance(args, str):
 
+        if orjson is not None:
+            try:
+                return orjson.loads(args)
+            except orjson.JSONDecodeError:
+                pass  # e.g., NaN or big integers, which only `json` accepts
         try:
             return json.loads(args)
         except json.JSONDecodeError:
@@ -181,44 +218,50 @@ def parse_tool_arguments(tool_call: dict) -> dict:
     return args
 
 
-def delete_instrumentation_comments(
-    source_code: dict[int, str], comment_token: str
-) -> dict[int, str]:
-    lines = [source_code[i] for i in range(1, len(source_code) + 1)]
+def _count_code_lines_without_comments(lines: list[str], comment_token: str) -> int:
+    """
+    Count the lines left after dropping the trailing blank lines and the trailing
+    instrumentation cost comments (scanning from the end, without copying `lines`).
+    """
+    end = len(lines)
 
-    while lines and lines[-1].strip() == "":
-        lines.pop()
+    while end > 0 and lines[end - 1].strip() == "":
+        end -= 1
 
     while (
-        lines
-        and lines[-1].strip().startswith(comment_token)
+        end > 0
+        and lines[end - 1].strip().startswith(comment_token)
         and (
-            "Total cost" in lines[-1]
-            or "Total split cost" in lines[-1]
-            or "Total instrumented cost" in lines[-1]
+            "Total cost" in lines[end - 1]
+            or "Total split cost" in lines[end - 1]
+            or "Total instrumented cost" in lines[end - 1]
         )
     ):
-        lines.pop()
+        end -= 1
+
+    return end
 
-    return {i + 1: lines[i] for i in range(len(lines))}
+
+def delete_instrumentation_comments(lines: list[str], comment_token: str) -> list[str]:
+    """
+    Delete the trailing blank lines and instrumentation cost comments from the code lines.
+    """
+    return lines[: _count_code_lines_without_comments(lines, comment_token)]
 
 
 def delete_instrumentation_from_code(
-    instrumented_code: dict[int, str], comment_token: str
-) -> dict[int, str]:
+    instrumented_lines: list[str], comment_token: str
+) -> list[str]:
     """
-    Delete instrumentation logging statements from the code.
+    Delete instrumentation logging statements from the code lines.
     """
-    instrumented_code = delete_instrumentation_comments(
-        instrumented_code, comment_token
-    )
-    original_code = {}
-    original_code_lines = 1
-    for _, line in instrumented_code.items():
-        if not re.match(TRACE_PATTERN, line.strip()):
-            original_code[original_code_lines] = line
-            original_code_lines += 1
-    return original_code
+    end = _count_code_lines_without_comments(instrumented_lines, comment_token)
+    code_lines = instrumented_lines[:end]
+    # skip matching every line if there is no logging statement at all (e.g., headers)
+    code = "\n".join(code_lines)
+    if "enter" not in code and "exit" not in code:
+        return code_lines
+    return [line for line in code_lines if not TRACE_PATTERN.match(line.strip())]
 
 
 SCHEDULING_FORMAT_REMINDER = (
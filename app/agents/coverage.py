@@ -2,9 +2,11 @@
 Coverage management for the concolic execution.
 """
 
-import copy
-import multiprocessing
+import functools
 import os
+import pickle
+import sys
+import threading
 import time
 
 import dill
@@ -12,12 +14,21 @@ from loguru import logger
 
 from app.agents.trace import TraceCollector
 
+SAVE_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+
+@functools.lru_cache(maxsize=8192)
+def _normalize_path(file_path: str) -> str:
+    """Normalized (and interned) file path used as the coverage key."""
+    return sys.intern(os.path.normpath(file_path))
+
 
 class Coverage:
     """Global coverage manager that tracks file coverage information."""
 
     _instance = None
-    _save_process: multiprocessing.Process | None = None
+    _save_thread: threading.Thread | None = None
+    _save_lock = threading.Lock()
 
     @classmethod
     def get_instance(cls):
@@ -33,6 +44,8 @@ class Coverage:
         self.file2cov: dict[str, TraceCollector] = (
             {}
         )  # relative file path (containing project dir) -> trace collector
+        # bumped whenever the collected coverage changes, to invalidate derived caches
+        self.epoch: int = 0
 
     def get_file_coverage(self, file_path) -> TraceCollector | None:
         """Get a TraceCollector for a specific file.
@@ -43,7 +56,7 @@ class Coverage:
         Returns:
             TraceCollector: The trace collector for the file
         """
-        file_path = os.path.normpath(file_path)
+        file_path = _normalize_path(file_path)
         if file_path not in self.file2cov:
             self.file2cov[file_path] = TraceCollector(file_path)
         return self.file2cov.get(file_path)
@@ -71,9 +84,11 @@ class Coverage:
         assert not (
             target_lines != (None, None) and not add_coverage
         ), "add_coverage should be True if target_lines is specified"
-        file_path = os.path.normpath(file_path)
+        file_path = _normalize_path(file_path)
         tc = self.get_file_coverage(file_path)
         if tc:
+            if add_coverage:
+                self.epoch += 1
             return tc.collect_trace(trace, target_lines, add_coverage)
         else:
             logger.error(f"Coverage information not available for file: {file_path}")
@@ -88,7 +103,7 @@ class Coverage:
         Returns:
             bool: Whether we have coverage information
         """
-        return os.path.normpath(file_path) in self.file2cov
+        return _normalize_path(file_path) in self.file2cov
 
     def get_all_files(self):
         """Get all files with coverage information.
@@ -98,80 +113,83 @@ class Coverage:
         """
         return list(self.file2cov.keys())
 
-    def _save_to_file_process(self, file_path: str, data: dict) -> None:
-        """Save coverage data in a separate process.
+    def _write_to_file(self, file_path: str, data: dict) -> None:
+        """Write coverage data to a file (only one writer at a time).
 
         Args:
             file_path (str): Path to save the coverage data
             data (dict): Data to save
         """
-        try:
+        with Coverage._save_lock:
             start_time = time.time()
 
-            with open(file_path, "wb") as f:
-                dill.dump(
-                    data,
-                    f,
-                    protocol=dill.HIGHEST_PROTOCOL,
-                    recurse=True,
-                    byref=False,
-                )
+            with open(file_path, "wb", buffering=SAVE_BUFFER_SIZE) as f:
+                try:
+                    # coverage data only holds plain containers, no need for dill
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                except (pickle.PicklingError, TypeError, AttributeError):
+                    logger.warning("Falling back to dill to save coverage data")
+                    f.seek(0)
+                    f.truncate()
+                    dill.dump(
+                        data,
+                        f,
+                        protocol=dill.HIGHEST_PROTOCOL,
+                        recurse=True,
+                        byref=False,
+                    )
 
             elapsed_time = time.time() - start_time
             logger.info(
                 f"Coverage data saved to {file_path} in {elapsed_time:.2f} seconds"
             )
+
+    def _save_to_file_thread(self, file_path: str, data: dict) -> None:
+        """Save coverage data in a background thread.
+
+        Args:
+            file_path (str): Path to save the coverage data
+            data (dict): Data to save
+        """
+        try:
+            self._write_to_file(file_path, data)
         except Exception as e:
             logger.error(f"Failed to save coverage data: {e}")
 
     def save_to_file(self, file_path: str, async_save: bool = True) -> bool:
-        """Save the coverage data to a file using dill.
+        """Save the coverage data to a file using pickle.
 
         Args:
             file_path (str): Path to save the coverage data
-            async_save (bool): Whether to save in a separate process
+            async_save (bool): Whether to save in a background thread
 
         Returns:
             bool: Whether the save was successful
         """
         try:
-            # Prepare data to save with deep copy
+            # Snapshot the coverage state, sharing everything that is never modified
             data_to_save = {
-                "file2cov": copy.deepcopy(self.file2cov),
+                "file2cov": {path: tc.freeze() for path, tc in self.file2cov.items()},
             }
 
             if async_save:
-                # Wait for previous save process to complete if it exists
+                # Wait for previous save thread to complete if it exists
                 if (
-                    Coverage._save_process is not None
-                    and Coverage._save_process.is_alive()
+                    Coverage._save_thread is not None
+                    and Coverage._save_thread.is_alive()
                 ):
-                    Coverage._save_process.join()
+                    Coverage._save_thread.join()
 
-                # Start new save process with current data
-                Coverage._save_process = multiprocessing.Process(
-                    target=self._save_to_file_process, args=(file_path, data_to_save)
+                # Start new save thread with current data
+                Coverage._save_thread = threading.Thread(
+                    target=self._save_to_file_thread, args=(file_path, data_to_save)
                 )
-                Coverage._save_process.start()
-                logger.info(f"Started async save process for {file_path}")
+                Coverage._save_thread.start()
+                logger.info(f"Started async save thread for {file_path}")
                 return True
             else:
                 # Synchronous save
-                start_time = time.time()
-
-                with open(file_path, "wb") as f:
-                    dill.dump(
-                        data_to_save,
-                        f,
-                        protocol=dill.HIGHEST_PROTOCOL,
-                        recurse=True,
-                        byref=False,
-                    )
-
-                elapsed_time = time.time() - start_time
-                logger.info(
-                    f"Coverage data saved to {file_path} in {elapsed_time:.2f} seconds"
-                )
+                self._write_to_file(file_path, data_to_save)
                 return True
         except Exception as e:
             logger.error(f"Failed to save coverage data: {e}")
@@ -179,7 +197,7 @@ class Coverage:
 
     @classmethod
     def load_from_file(cls, file_path):
-        """Load coverage data from a file using dill.
+        """Load coverage data from a file saved by pickle (or dill, for older files).
 
         Args:
             file_path (str): Path to load the coverage data from
@@ -191,9 +209,14 @@ class Coverage:
             start_time = time.time()
 
             with open(file_path, "rb") as f:
-                loaded_data = dill.load(f)
+                try:
+                    loaded_data = pickle.load(f)
+                except Exception:
+                    f.seek(0)
+                    loaded_data = dill.load(f)
                 instance = cls.get_instance()
                 instance.file2cov = loaded_data["file2cov"]
+                instance.epoch += 1
                 cls._instance = instance
 
             elapsed_time = time.time() - start_time
@@ -5,20 +5,22 @@ This module provides a data structure similar to fuzzing seeds to store
 information about each test case generated during concolic execution.
 """
 
-import fcntl
-import io
-import math
+import concurrent.futures
+import contextlib
+import heapq
 import os
+import re
 import shutil
+import sys
+import threading
 import time
-from dataclasses import asdict, dataclass, field
-from datetime import datetime
-from io import StringIO
-from typing import Any
+from collections.abc import Callable
+from dataclasses import dataclass, field, fields
+from operator import itemgetter
+from typing import Any, TextIO
 
 import yaml as pyyaml
 from loguru import logger
-from ruamel.yaml import YAML, scalarstring
 
 from app.agents.common import (
     SCHEDULING_FORMAT_REMINDER,
@@ -33,7 +35,7 @@ from app.agents.common import (
 )
 from app.agents.coverage import Coverage
 from app.agents.states import TestcaseState
-from app.agents.trace import trace_compress
+from app.agents.trace import TraceCollector, trace_compress
 from app.model.common import Usage
 from app.utils.utils import estimate_text_token, get_time_taken
 
@@ -41,6 +43,9 @@ from app.utils.utils import estimate_text_token, get_time_taken
 # Create YAML configuration function
 def create_yaml_instance():
     """Create a properly configured YAML instance."""
+    # ruamel is only needed as a fallback, so it is imported on first use
+    from ruamel.yaml import YAML
+
     yaml = YAML()
     yaml.preserve_quotes = True
     yaml.default_flow_style = False
@@ -49,6 +54,94 @@ def create_yaml_instance():
     return yaml
 
 
+_yaml_local = threading.local()
+
+
+def get_yaml_instance():
+    """Get the YAML instance of the current thread, creating it on first use."""
+    yaml = getattr(_yaml_local, "yaml", None)
+    if yaml is None:
+        yaml = _yaml_local.yaml = create_yaml_instance()
+    return yaml
+
+
+# AFL-style test case file name, e.g., "id:000001,src:000000.yaml"
+TESTCASE_FILENAME_PATTERN = re.compile(r"^id:(\d+)(?:,src:\d+)?\.yaml$")
+
+# control characters filtered out of test case files before parsing: NULL, EOT, DEL
+STRIPPED_CONTROL_BYTES = b"\x00\x04\x7f"
+
+# large, opaque fields saved as sidecar text files next to the test case YAML file
+SIDECAR_FIELDS = (
+    "exec_code",
+    "execution_trace",
+    "src_execution_trace",
+    "execution_summary",
+)
+
+# string form of each test case state, used as YAML values and usage keys
+_STATE_STR: dict[TestcaseState, str] = {state: str(state) for state in TestcaseState}
+_FINISHED = TestcaseState.FINISHED
+
+# maximum number of threads to load or save test cases with
+IO_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+# libyaml (C) bindings for the save/load hot paths; ruamel is kept as a fallback
+class _C_DUMPER(getattr(pyyaml, "CSafeDumper", pyyaml.SafeDumper)):
+    """Safe dumper writing multi-line strings in YAML block style."""
+
+
+_C_LOADER = getattr(pyyaml, "CSafeLoader", pyyaml.SafeLoader)
+
+
+def _str_representer(dumper, data):
+    """Use YAML block style for multi-line strings."""
+    style = "|" if "\n" in data else None
+    # the C emitter only accepts exact str values
+    return dumper.represent_scalar("tag:yaml.org,2002:str", str(data), style=style)
+
+
+_C_DUMPER.add_representer(str, _str_representer)
+# str subclasses, e.g., ruamel's LiteralScalarString
+_C_DUMPER.add_multi_representer(str, _str_representer)
+
+
+def _now_str() -> str:
+    """Current local time as "%Y-%m-%d %H:%M:%S" with milliseconds."""
+    seconds, ms = divmod(time.time_ns() // 1_000_000, 1000)
+    return f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seconds))}.{ms:03d}"
+
+
+def _freeze(value: Any) -> Any:
+    """Convert (nested) lists and dictionaries into hashable tuples."""
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _tmp_path(path: str) -> str:
+    """Temporary path next to path, unique per process and thread."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hardlink dst to src (copy if hardlinks are not supported), replacing dst if it exists."""
+    try:
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            if os.path.samefile(src, dst):
+                return
+            tmp_path = _tmp_path(dst)
+            os.link(src, tmp_path)
+            os.replace(tmp_path, dst)
+    except OSError:
+        shutil.copy(src, dst)
+
+
 class TestCaseYAML:
     """Custom YAML handlers for TestCase serialization."""
 
@@ -74,15 +167,15 @@ class TestCaseYAML:
         return (file_path, (int(start), int(end)))
 
     @staticmethod
-    def format_usage_dict(usage_dict: dict, print_tokens: bool = True) -> str:
-        """Format a dictionary containing Usage objects into a readable string.
+    def format_usage(usage_dict: dict, print_tokens: bool = True) -> dict:
+        """Format a dictionary containing Usage objects into plain dictionaries.
 
         Args:
             usage_dict: Dictionary containing Usage objects or nested dictionaries
             print_tokens: Whether to include token counts in the output
 
         Returns:
-            str: Formatted string representation of the dictionary
+            dict: Dictionary with the Usage objects replaced by their dumps
         """
 
         def format_value(value):
@@ -93,39 +186,44 @@ class TestCaseYAML:
             else:
                 return value
 
-        formatted_dict = {k: format_value(v) for k, v in usage_dict.items()}
+        return {k: format_value(v) for k, v in usage_dict.items()}
 
-        # Use YAML dump for better formatting
-        yaml_formatter = create_yaml_instance()
+    @staticmethod
+    def format_usage_dict(usage_dict: dict, print_tokens: bool = True) -> str:
+        """Format a dictionary containing Usage objects into a readable string.
 
-        # Convert to string using YAML
-        string_stream = StringIO()
-        yaml_formatter.dump(formatted_dict, string_stream)
-        return string_stream.getvalue()
+        Args:
+            usage_dict: Dictionary containing Usage objects or nested dictionaries
+            print_tokens: Whether to include token counts in the output
 
-    @staticmethod
-    def parse_usage_dict(yaml_str: str) -> dict[str, Usage]:
-        """Parse a YAML string into a dictionary of Usage objects.
+        Returns:
+            str: Formatted string representation of the dictionary
+        """
+        # Use YAML dump for better formatting
+        return pyyaml.dump(
+            TestCaseYAML.format_usage(usage_dict, print_tokens=print_tokens),
+            Dumper=_C_DUMPER,
+            default_flow_style=False,
+            sort_keys=False,
+            allow_unicode=True,
+        )
 
-        This function reverses the operation performed by format_usage_dict.
-        It parses a YAML string and reconstructs Usage objects from their serialized form.
+    @staticmethod
+    def parse_usage(data: dict) -> dict[str, Usage]:
+        """Reconstruct Usage objects from a dictionary produced by format_usage.
 
         Args:
-            yaml_str: YAML string representation of usage data
+            data: Dictionary of (nested) usage data
 
         Returns:
             dict: Dictionary with string keys and Usage object values
         """
-
-        # Parse YAML string to dictionary
-        data = pyyaml.safe_load(yaml_str)
-        if not data:
-            return {}
-
         result = {}
 
-        # Process each key in the YAML data
+        # Process each key in the usage data. The keys (state and tool names) repeat in
+        # every test case, so intern them to share one string among all loaded test cases
         for key, value in data.items():
+            key = sys.intern(key)
             if isinstance(value, dict):
                 if "TOTAL" in value:
                     # Handle nested dictionary with TOTAL and other keys
@@ -139,6 +237,27 @@ class TestCaseYAML:
 
         return result
 
+    @staticmethod
+    def parse_usage_dict(yaml_str: str) -> dict[str, Usage]:
+        """Parse a YAML string into a dictionary of Usage objects.
+
+        This function reverses the operation performed by format_usage_dict.
+        It parses a YAML string and reconstructs Usage objects from their serialized form.
+
+        Args:
+            yaml_str: YAML string representation of usage data
+
+        Returns:
+            dict: Dictionary with string keys and Usage object values
+        """
+
+        # Parse YAML string to dictionary
+        data = pyyaml.load(yaml_str, Loader=_C_LOADER)
+        if not data:
+            return {}
+
+        return TestCaseYAML.parse_usage(data)
+
     @staticmethod
     def _process_nested_usage_dict(nested_dict: dict) -> dict[str, Usage]:
         """Process a nested dictionary of usage data.
@@ -152,6 +271,7 @@ class TestCaseYAML:
         result = {}
 
         for key, value in nested_dict.items():
+            key = sys.intern(key)
             if isinstance(value, dict):
                 result[key] = Usage.model_validate(value)
             else:
@@ -176,16 +296,11 @@ class TestCaseYAML:
             and isinstance(result["states"], list)
             and result["states"]
         ):
-            result["states"] = [str(state) for state in result["states"]]
+            result["states"] = [_STATE_STR[state] for state in result["states"]]
 
         # Handle usage dictionary if it's not empty
         if "usage" in result and isinstance(result["usage"], dict) and result["usage"]:
-            result["usage"] = TestCaseYAML.format_usage_dict(result["usage"])
-
-        # use YAML block style for all string fields
-        for _field, value in result.items():
-            if isinstance(value, str) and "\n" in value:
-                result[_field] = scalarstring.LiteralScalarString(value)
+            result["usage"] = TestCaseYAML.format_usage(result["usage"])
 
         return result
 
@@ -210,8 +325,10 @@ class TestCaseYAML:
         ):
             result["states"] = [TestcaseState[state] for state in result["states"]]
 
-        # Parse usage string back to dictionary if it looks like YAML
-        if (
+        if "usage" in result and isinstance(result["usage"], dict):
+            result["usage"] = TestCaseYAML.parse_usage(result["usage"])
+        # Older test case files store the usage as a YAML string
+        elif (
             "usage" in result
             and isinstance(result["usage"], str)
             and result["usage"].strip()
@@ -240,7 +357,7 @@ class TestCase:
     )
 
     create_time: str = field(
-        default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        default_factory=_now_str
     )  # creation time of this test case
     time_taken: int | None = (
         None  # time taken to generate this test case (in seconds). Continously updated before the test case has been finished.
@@ -286,72 +403,26 @@ class TestCase:
 
     # Output directory (non-serialized)
     _out_dir: str | None = field(default=None, repr=False)
-    _in_setattr: bool = field(
-        default=False, repr=False
-    )  # Flag to prevent infinite recursion
+    # Hash of the last saved content, to skip saving an unchanged test case
+    _last_saved_hash: int | None = field(default=None, repr=False)
+    # Formatted usage, only reset when the usage is changed in `add_usage`
+    _formatted_usage: dict | None = field(default=None, repr=False)
+    # Hash of each sidecar file content when it was last saved
+    _sidecar_hashes: dict[str, int] = field(default_factory=dict, repr=False)
+    # Scheduling information with the (coverage epoch, trace length, history) it was built for
+    _sched_cache: tuple[tuple, str, float] | None = field(
+        default=None, repr=False, compare=False
+    )
 
     def __post_init__(self):
         """Called after dataclass initialization."""
         # Ensure non-serialized fields are initialized
-        object.__setattr__(self, "_out_dir", None)
-        object.__setattr__(self, "_in_setattr", False)
-
-    def __setattr__(self, name, value):
-        """
-        Intercept attribute assignments to automatically save when modified.
+        self._out_dir = None
 
-        This will be called whenever an attribute is set on the object.
-        """
-        # safely check _in_setattr attribute, use try-except to catch possible exceptions
-        try:
-            in_setattr = self._in_setattr
-        except (AttributeError, TypeError):
-            # if the attribute does not exist or the object is not fully initialized, set a default value
-            in_setattr = False
-
-        # avoid infinite recursion
-        if in_setattr:
-            object.__setattr__(self, name, value)
-            return
-
-        # set the attribute
-        object.__setattr__(self, name, value)
-
-        # Update time_taken if not setting time_taken itself
-        if (
-            name != "time_taken"
-            and not name.startswith("_")
-            and hasattr(self, "states")  # ensure states attribute is initialized
-            and self.states  # ensure states is not empty
-            and self.states[-1] != TestcaseState.FINISHED
-        ):
-            object.__setattr__(
-                self,
-                "time_taken",
-                get_time_taken(),
-            )
-
-        # Auto-save functionality disabled to prevent file I/O errors
-        # If you want to save the object, call save_to_disk() explicitly
-        # try:
-        #     # only save when the attribute is not a private attribute and _out_dir exists
-        #     if (
-        #         not name.startswith("_")
-        #         and hasattr(self, "_out_dir")
-        #         and self._out_dir is not None
-        #     ):
-        #         # set the flag to prevent recursion
-        #         object.__setattr__(self, "_in_setattr", True)
-        #         try:
-        #             self.save_to_disk()
-        #         finally:
-        #             # reset the flag
-        #             object.__setattr__(self, "_in_setattr", False)
-        # except Exception as e:
-        #     # record the error but allow the attribute setting to succeed
-        #     logger.error(f"Error during auto-save in __setattr__: {e}")
-        #     # ensure the flag is reset
-        #     object.__setattr__(self, "_in_setattr", False)
+    def _touch(self) -> None:
+        """Update time_taken if the test case has not been finished yet."""
+        if self.states and self.states[-1] is not _FINISHED:
+            self.time_taken = get_time_taken()
 
     @property
     def current_state(self) -> TestcaseState | None:
@@ -360,6 +431,7 @@ class TestCase:
 
     def add_state(self, state: TestcaseState) -> None:
         """Add a new state to the state history."""
+        self._touch()
         self.states.append(state)
 
     @classmethod
@@ -394,8 +466,7 @@ class TestCase:
         )
         # Set output directory and ensure initial save
         if out_dir:
-            # Use direct attribute setting instead of __dict__
-            setattr(tc, "_out_dir", out_dir)
+            tc._out_dir = out_dir
             tc.save_to_disk()  # Explicitly save after creation
         return tc
 
@@ -412,10 +483,10 @@ class TestCase:
                 TestcaseState.SUMMARIZE,
             ],  # the first state of a new test case is always SUMMARIZE
         )
+        tc._touch()
         # Inherit parent's output directory
         if src_tc._out_dir:
-            # Use direct attribute setting
-            setattr(tc, "_out_dir", src_tc._out_dir)
+            tc._out_dir = src_tc._out_dir
             tc.save_to_disk()  # Explicitly save after creation
         else:
             raise ValueError("Source test case has no output directory")
@@ -426,15 +497,17 @@ class TestCase:
 
     def to_dict(self) -> dict[str, Any]:
         """Convert the test case to a dictionary for YAML serialization."""
-        # Use asdict to convert dataclass to dict
-        data = asdict(self)
-        # Remove non-serialized fields
-        for _field in ["_out_dir", "_in_setattr"]:
-            if _field in data:
-                del data[_field]
+        # Read the serialized fields directly (no deep copy as in `asdict`)
+        data = {name: getattr(self, name) for name in _SERIALIZED_FIELDS}
+        data["usage"] = None  # formatted below
 
         # Process data for better YAML representation
-        return TestCaseYAML.process_dict_for_yaml(data)
+        result = TestCaseYAML.process_dict_for_yaml(data)
+
+        if self._formatted_usage is None:
+            self._formatted_usage = TestCaseYAML.format_usage(self.usage)
+        result["usage"] = self._formatted_usage
+        return result
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "TestCase":
@@ -443,44 +516,42 @@ class TestCase:
         processed_data = TestCaseYAML.process_dict_from_yaml(data)
 
         # Remove non-serialized fields if they are in the dictionary
-        for _field in ["_out_dir", "_in_setattr"]:
-            if _field in processed_data:
-                del processed_data[_field]
+        if "_out_dir" in processed_data:
+            del processed_data["_out_dir"]
 
         return cls(**processed_data)
 
-    def write_to_yaml_file(self, yaml_path: str, content: str) -> None:
-        """Write content to a YAML file with file locking."""
-        # maximum number of retries
-        max_retries = 3
-        retry_delay = 0.1
+    def write_to_yaml_file(
+        self, yaml_path: str, write_fn: Callable[[TextIO], None], sync: bool = True
+    ) -> None:
+        """Atomically write a YAML file by writing a temporary file and renaming it.
 
-        for attempt in range(max_retries):
-            try:
-                with open(yaml_path, "w") as yaml_file:
-                    # acquire an exclusive lock
-                    fcntl.flock(yaml_file.fileno(), fcntl.LOCK_EX)
-                    try:
-                        yaml_file.write(content)
-                    finally:
-                        # release the lock
-                        fcntl.flock(yaml_file.fileno(), fcntl.LOCK_UN)
-                    return  # successfully write, exit function
-            except (ValueError, OSError) as e:
-                logger.warning(
-                    f"Attempt {attempt+1}/{max_retries} failed to write to {yaml_path}: {e}"
-                )
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)  # brief delay before retrying
-                else:
-                    # last attempt, record the error but do not raise an exception
-                    raise Exception(
-                        f"Failed to save test case to {yaml_path}, reached the maximum number of retries"
-                    )
+        Readers never see a truncated or partially written file.
 
-    def save_to_disk(self) -> None:  # should ensure "queue" directory exists
+        Args:
+            yaml_path: Path to the YAML file
+            write_fn: Function writing the content to the opened file
+            sync: Whether to fsync the file before renaming it
+        """
+        tmp_path = _tmp_path(yaml_path)
+        try:
+            with open(tmp_path, "w") as yaml_file:
+                write_fn(yaml_file)
+                if sync:
+                    yaml_file.flush()
+                    os.fsync(yaml_file.fileno())
+            os.replace(tmp_path, yaml_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp_path)
+            raise
+
+    def save_to_disk(self, sync: bool = True) -> None:
         """
-        Save the test case information to disk.
+        Save the test case information to disk (the "queue" directory should exist).
+
+        Args:
+            sync: Whether to fsync the file (callers saving in batches sync the directory once instead)
         """
         if not self._out_dir:
             raise ValueError("Cannot save test case: no output directory specified")
@@ -492,57 +563,78 @@ class TestCase:
         data = self.to_dict()
 
         # Construct filename using AFL-style naming convention
+        padded_id = str(self.id).zfill(6)
         if self.src_id is not None:
-            filename = f"id:{self.id:06d},src:{self.src_id:06d}.yaml"
+            filename = f"id:{padded_id},src:{str(self.src_id).zfill(6)}.yaml"
         else:
-            filename = f"id:{self.id:06d}.yaml"
+            filename = f"id:{padded_id}.yaml"
 
-        # Try multiple serialization methods for robustness
-        yaml_str = None
-        try:
-            # Create a new YAML instance each time
-            yaml_instance = create_yaml_instance()
-            string_stream = io.StringIO()
-            yaml_instance.dump(data, string_stream)
-            yaml_str = string_stream.getvalue()
-        except Exception as e:
-            logger.error(
-                f"Primary YAML serialization failed: {e}\nOriginal data:\n{data}"
-            )
+        # Skip saving if nothing changed (strings cache their hash, so this is cheap)
+        saved_hash = hash((self._out_dir, _freeze(data)))
+        if saved_hash == self._last_saved_hash:
+            return
+
+        # Save large fields as sidecar files (only when changed), the YAML only points to them
+        sidecars: dict[str, str] = {}
+        for _field in SIDECAR_FIELDS:
+            value = data.pop(_field)
+            if value is None:
+                continue
+            sidecars[_field] = f"id:{padded_id}.{_field}.txt"
+            sidecar_hash = hash((self._out_dir, value))
+            if self._sidecar_hashes.get(_field) != sidecar_hash:
+                self.write_to_yaml_file(
+                    os.path.join(queue_dir, sidecars[_field]),
+                    lambda f, value=value: f.write(value),
+                    sync=sync,
+                )
+                self._sidecar_hashes[_field] = sidecar_hash
+        if sidecars:
+            data["sidecars"] = sidecars
+
+        def write_yaml(yaml_file: TextIO) -> None:
+            # Try multiple serialization methods for robustness, dumping to the file directly
             try:
-                # Fallback to a simpler YAML instance
-                backup_yaml = YAML()
-                backup_yaml.default_flow_style = False
-                string_stream = io.StringIO()
-                backup_yaml.dump(data, string_stream)
-                yaml_str = string_stream.getvalue()
-            except Exception as e2:
-                logger.error(f"Secondary YAML serialization failed:\n{e2}\n")
+                pyyaml.dump(
+                    data,
+                    yaml_file,
+                    Dumper=_C_DUMPER,
+                    default_flow_style=False,
+                    sort_keys=False,
+                    allow_unicode=True,
+                )
+            except Exception as e:
+                logger.error(
+                    f"Primary YAML serialization failed: {e}\nOriginal data:\n{data}"
+                )
+                yaml_file.seek(0)
+                yaml_file.truncate()
                 try:
-                    # Final fallback to pyyaml
-                    yaml_str = pyyaml.safe_dump(
-                        data, default_flow_style=False, sort_keys=False
-                    )
-                except Exception as e3:
-                    err_msg = f"Final YAML serialization fallback failed:\n{e3}"
+                    # Fallback to ruamel
+                    get_yaml_instance().dump(data, yaml_file)
+                except Exception as e2:
+                    err_msg = f"Fallback YAML serialization failed:\n{e2}"
                     logger.error(err_msg)
                     raise RuntimeError(err_msg)
 
-        assert yaml_str is not None
-
         # Save to queue folder
         yaml_path = os.path.join(queue_dir, filename)
 
-        self.write_to_yaml_file(yaml_path, yaml_str)
+        self.write_to_yaml_file(yaml_path, write_yaml, sync=sync)
 
         # Optionally also save to crashes folder - only if it's a crash
         if self.is_crash or self.is_hang:
             _dir = os.path.join(self._out_dir, "crashes_or_hangs")
             os.makedirs(_dir, exist_ok=True)
 
-            # Use the same filename and copy the file to crashes_or_hangs folder
-            _file_path = os.path.join(_dir, filename)
-            shutil.copy(yaml_path, _file_path)
+            # Use the same filename and hardlink the file into crashes_or_hangs folder.
+            # Both entries share one inode, so edit them by re-creating, not in place.
+            for _filename in [filename, *sidecars.values()]:
+                _link_or_copy(
+                    os.path.join(queue_dir, _filename), os.path.join(_dir, _filename)
+                )
+
+        self._last_saved_hash = saved_hash
 
     @classmethod
     def load_from_file(cls, yaml_path: str, out_dir: str) -> "TestCase":
@@ -556,35 +648,38 @@ class TestCase:
         # Use binary mode to read the file and filter out NULL characters
         with open(yaml_path, "rb") as yaml_file:
             content = yaml_file.read()
-            # Filter out NULL characters, keep all other characters
-            content = content.replace(b"\x00", b"")
-            # Filter out EOT (End of Transmission) characters - ASCII 0x04
-            content = content.replace(b"\x04", b"")
-            # Also filter DEL character (0x7F)
-            content = content.replace(b"\x7F", b"")
-
-            # # Filter out other control characters that may cause issues
-            # # Keep whitespace characters: TAB (0x09), LF (0x0A), CR (0x0D)
-            # for i in range(0, 32):
-            #     if i not in (9, 10, 13):  # Skip TAB, LF, CR
-            #         content = content.replace(bytes([i]), b"")
-
-            yaml_instance = create_yaml_instance()
-            data = yaml_instance.load(content.decode("utf-8", errors="replace"))
+            # Filter out NULL, EOT (End of Transmission) and DEL characters in one pass,
+            # keep all other characters
+            content = content.translate(None, STRIPPED_CONTROL_BYTES)
+
+            content = content.decode("utf-8", errors="replace")
+
+        try:
+            data = pyyaml.load(content, Loader=_C_LOADER)
+        except pyyaml.YAMLError as e:
+            logger.warning(
+                f"Failed to parse {yaml_path} with PyYAML, using ruamel: {e}"
+            )
+            data = get_yaml_instance().load(content)
 
         if not isinstance(data, dict):
             raise ValueError("Invalid YAML format")
 
+        # Read the fields saved as sidecar files (older files keep them inline)
+        yaml_dir = os.path.dirname(yaml_path)
+        for _field, sidecar in (data.pop("sidecars", None) or {}).items():
+            if _field in data:
+                continue
+            with open(os.path.join(yaml_dir, sidecar), "rb") as sidecar_file:
+                data[_field] = (
+                    sidecar_file.read()
+                    .translate(None, STRIPPED_CONTROL_BYTES)
+                    .decode("utf-8", errors="replace")
+                )
+
         tc = cls.from_dict(data)
         if out_dir:
-            # Use direct attribute setting
-            setattr(tc, "_out_dir", out_dir)
-
-        setattr(
-            tc,
-            "time_taken",
-            data["time_taken"],
-        )  # since time_taken would automatically be set in __setattr__, ensure it confirms to the YAML file
+            tc._out_dir = out_dir
         return tc
 
     def __str__(self) -> str:
@@ -596,11 +691,14 @@ class TestCase:
 
     def add_usage(self, usage: dict, state: TestcaseState | None = None):
         """Add usage information to the test case."""
+        self._touch()
         self.usage["TOTAL"] += usage["TOTAL"]
         if state is None:
             state = self.current_state
-        assert str(state) not in self.usage
-        self.usage[str(state)] = usage
+        state_str = _STATE_STR[state]
+        assert state_str not in self.usage
+        self.usage[state_str] = usage
+        self._formatted_usage = None
 
     def get_historical_information(self) -> tuple[int, int]:
         """
@@ -626,6 +724,60 @@ class TestCase:
         return self.is_target_covered or self.new_coverage
 
 
+def _ceil_percentage(covered: int, total: int) -> int:
+    """Percentage of covered / total rounded up, in integer arithmetic."""
+    return -(-covered * 100 // total)
+
+
+def _select_lowest_coverage_indices(
+    line_covs: list[tuple[int, int]], show_num: int
+) -> list[int]:
+    """
+    Select the functions of a call chain to show: the first and last ones, and the
+    `show_num` - 2 ones with the lowest line coverage in between.
+
+    Args:
+        line_covs: The (covered, total) line coverage of each function in the chain
+        show_num: The number of functions to show
+
+    Returns:
+        The indices of the selected functions, in the order of the call chain
+    """
+    # Ensure the first and last functions are selected
+    first_index = 0
+    last_index = len(line_covs) - 1
+
+    # Get the indices of the show_num-2 functions with the lowest coverage (if any),
+    # excluding the first and last; a partial selection is enough as only a few of
+    # the (possibly thousands of) functions are shown
+    def line_cov_ratio(i: int) -> float:
+        covered, total = line_covs[i]
+        return covered / total
+
+    middle_indices = heapq.nsmallest(
+        show_num - 2, range(first_index + 1, last_index), key=line_cov_ratio
+    )
+
+    # Merge indices: first + middle + last, in the original order of the call chain
+    lowest_indices = [first_index] + middle_indices + [last_index]
+    lowest_indices.sort()
+    return lowest_indices
+
+
+def _format_call_chain_part(
+    part: tuple[str, str, tuple[int, int], tuple[int, int]],
+) -> str:
+    """Format a function of the call chain with its line and executed block coverage."""
+    file_path, func_name, line_cov, block_cov = part
+    return f"{file_path}[{func_name} ({_ceil_percentage(*line_cov)}%)][{_ceil_percentage(*block_cov)}%]"
+
+
+# non-serialized fields are prefixed with "_"
+_SERIALIZED_FIELDS: tuple[str, ...] = tuple(
+    f.name for f in fields(TestCase) if not f.name.startswith("_")
+)
+
+
 class TestCaseManager:
     """Manages a collection of test cases during concolic execution."""
 
@@ -634,6 +786,12 @@ class TestCaseManager:
         self.out_dir = out_dir
         self.test_cases: dict[int, TestCase] = {}
         self.next_testcase_id = 0
+        # source test case ID -> IDs of the test cases derived from it
+        self._children: dict[int, list[int]] = {}
+        # IDs of the test cases that are not finished yet when last checked, and of
+        # the finished valuable ones (a finished test case is not changed anymore)
+        self._unfinished_ids: set[int] = set()
+        self._valuable_ids: set[int] = set()
 
         # Only create queue directory at initialization
         os.makedirs(os.path.join(out_dir, "queue"), exist_ok=True)
@@ -657,6 +815,7 @@ class TestCaseManager:
             self.out_dir,
         )
         self.test_cases[self.next_testcase_id] = testcase
+        self._unfinished_ids.add(self.next_testcase_id)
         self.next_testcase_id += 1
         if save_immediately:
             testcase.save_to_disk()
@@ -686,8 +845,11 @@ class TestCaseManager:
         testcase.target_file_lines = target_file_lines
         testcase.target_lines_content = target_lines_content
         testcase.target_path_constraint = target_path_constraint
+        testcase._touch()
 
         self.test_cases[self.next_testcase_id] = testcase
+        self._children.setdefault(src_id, []).append(self.next_testcase_id)
+        self._unfinished_ids.add(self.next_testcase_id)
         self.next_testcase_id += 1
         if save_immediately:
             testcase.save_to_disk()
@@ -703,21 +865,37 @@ class TestCaseManager:
             raise ValueError(f"Test case with ID {src_id} does not exist.")
 
         result = []
-        for _id in range(src_id + 1, self.next_testcase_id):
+        for _id in self._children.get(src_id, ()):
             tc = self.get_testcase(_id)
-            if (
-                tc.current_state != TestcaseState.FINISHED
-            ):  # only count for finished test cases
+            if tc.current_state is not _FINISHED:  # only count for finished test cases
                 continue
-            if tc.src_id == src_id:
-                if not (tc.is_crash_or_hang() or tc.is_valuable()):
-                    result.append(tc.target_branch)
+            if not (tc.is_crash_or_hang() or tc.is_valuable()):
+                result.append(tc.target_branch)
         return result
 
     def save_all_testcases(self) -> None:
         """Save all test cases to disk."""
-        for tc in self.test_cases.values():
-            tc.save_to_disk()
+        if not self.test_cases:
+            return
+
+        # Save concurrently without per-file fsync, then sync the directories once
+        max_workers = min(IO_MAX_WORKERS, len(self.test_cases))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(tc.save_to_disk, sync=False)
+                for tc in self.test_cases.values()
+            ]
+            for future in futures:
+                future.result()
+
+        for _dir in ("queue", "crashes_or_hangs"):
+            dir_path = os.path.join(self.out_dir, _dir)
+            if os.path.isdir(dir_path):
+                fd = os.open(dir_path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
 
     def _load_testcases_from_dir(
         self,
@@ -738,24 +916,29 @@ class TestCaseManager:
         testcases = {}
         max_id = 0
 
-        for filename in os.listdir(directory):
-            if filename.endswith(".yaml") and filename.startswith("id:"):
-                # Extract ID from filename (format: id:000000,src:000000.yaml)
-                if "," in filename:
-                    id_part = filename.split(",")[0]
-                else:
-                    id_part = filename.split(".")[0]
-
-                id_str = id_part[3:]  # Remove "id:" prefix
+        # Extract ID from filename (format: id:000000,src:000000.yaml)
+        tc_files: list[tuple[int, str, str]] = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                match = TESTCASE_FILENAME_PATTERN.match(entry.name)
+                if match and entry.is_file():
+                    tc_files.append((int(match.group(1)), entry.name, entry.path))
+        tc_files.sort()
+
+        # Load files concurrently to overlap file reads
+        max_workers = min(IO_MAX_WORKERS, max(len(tc_files), 1))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                (
+                    tc_id,
+                    filename,
+                    executor.submit(TestCase.load_from_file, yaml_path, self.out_dir),
+                )
+                for tc_id, filename, yaml_path in tc_files
+            ]
+            for tc_id, filename, future in futures:
                 try:
-                    tc_id = int(id_str)
-
-                    # Load directly from file path
-                    yaml_path = os.path.join(directory, filename)
-                    testcase = TestCase.load_from_file(yaml_path, self.out_dir)
-
-                    # Add to appropriate dictionary
-                    testcases[tc_id] = testcase
+                    testcases[tc_id] = future.result()
                     max_id = max(max_id, tc_id)
                 except Exception as e:
                     logger.error(f"Error loading test case from file: {filename} - {e}")
@@ -770,6 +953,13 @@ class TestCaseManager:
         self.test_cases, self.next_testcase_id = self._load_testcases_from_dir(
             os.path.join(in_dir, "queue")
         )
+        self._children = {}
+        self._unfinished_ids = set(self.test_cases)
+        self._valuable_ids = set()
+        for tc_id in sorted(self.test_cases):
+            src_id = self.test_cases[tc_id].src_id
+            if src_id is not None:
+                self._children.setdefault(src_id, []).append(tc_id)
 
         # Log summary of loaded test cases
         logger.info(f"Loaded {len(self.test_cases)} test cases")
@@ -795,7 +985,7 @@ class TestCaseManager:
             if testcase.src_id is None:
                 continue  # initial testcase is not included
 
-            if testcase.current_state != TestcaseState.FINISHED:
+            if testcase.current_state is not _FINISHED:
                 continue  # unfinished testcase is not included
 
             gen_finished_tc_cnt += 1
@@ -844,13 +1034,17 @@ class TestCaseManager:
 
     def get_crash_and_hang_count(self) -> tuple[int, int]:
         """Get the number of crashes and hangs."""
-        crashes = sum(1 for tc in self.test_cases.values() if tc.is_crash)
-        hangs = sum(1 for tc in self.test_cases.values() if tc.is_hang)
+        crashes = hangs = 0
+        for tc in self.test_cases.values():
+            if tc.is_crash:
+                crashes += 1
+            if tc.is_hang:
+                hangs += 1
         return crashes, hangs
 
     def get_max_time_taken(self) -> int:
         """Get the maximum time taken to generate all test cases."""
-        return max(tc.time_taken for tc in self.test_cases.values())
+        return max((tc.time_taken for tc in self.test_cases.values()), default=0)
 
     def get_all_scheduling_information(self) -> dict[int, str]:
         """
@@ -864,56 +1058,73 @@ class TestCaseManager:
         if not self.test_cases:
             raise ValueError("No test cases available.")
 
-        valuable_testcase_info: list[tuple[str, float, int]] = []
-
-        for tc_id, tc in self.test_cases.items():
-            if tc.is_valuable():
-                if tc.current_state != TestcaseState.FINISHED:
-                    logger.error(
-                        "Test case #{} is valuable but not finished, this should not happen",
-                        tc_id,
-                    )
-                assert tc.exec_code is not None
-                info, weight = self.get_test_case_scheduling_information(tc_id)
-                info = wrap_between_tags(
-                    TestCaseInformation.__xml_tag__,
-                    info,
+        valuable_tc_ids = set(self._valuable_ids)
+        for tc_id in list(self._unfinished_ids):
+            tc = self.test_cases[tc_id]
+            if tc.current_state is _FINISHED:
+                self._unfinished_ids.discard(tc_id)
+                if tc.is_valuable():
+                    self._valuable_ids.add(tc_id)
+                    valuable_tc_ids.add(tc_id)
+            elif tc.is_valuable():
+                logger.error(
+                    "Test case #{} is valuable but not finished, this should not happen",
+                    tc_id,
                 )
-                valuable_testcase_info.append((info, weight, tc_id))
+                valuable_tc_ids.add(tc_id)
 
-        raw_str = "\n\n".join(
-            [SCHEDULING_FORMAT_REMINDER]
-            + [info for info, _, _ in valuable_testcase_info]
-        )
+        valuable_testcase_info: list[tuple[str, float, int]] = []
+
+        for tc_id in sorted(valuable_tc_ids):
+            tc = self.test_cases[tc_id]
+            assert tc.exec_code is not None
+            info, weight = self.get_test_case_scheduling_information(tc_id)
+            info = wrap_between_tags(
+                TestCaseInformation.__xml_tag__,
+                info,
+            )
+            valuable_testcase_info.append((info, weight, tc_id))
 
         TOKEN_LIMIT = 180 * 1000
 
-        estimated_token = estimate_text_token(raw_str)
+        # counting tokens is an API request, so the whole prompt is counted at once
+        estimated_token = estimate_text_token(
+            "\n\n".join(
+                [SCHEDULING_FORMAT_REMINDER]
+                + [info for info, _, _ in valuable_testcase_info]
+            )
+        )
         logger.info(
             "Estimated token for scheduling before truncation: {}", estimated_token
         )
 
         if estimated_token > TOKEN_LIMIT:
             logger.info("Truncating test cases due to token limit")
-            selected_tc_ids = []
             # sort by weight in descending order
-            valuable_testcase_info.sort(key=lambda x: (x[1], x[2]), reverse=True)
-
-            truncated_str = SCHEDULING_FORMAT_REMINDER + "\n\n"
-            for info, weight, tc_id in valuable_testcase_info:
-                if estimate_text_token(truncated_str + info) > TOKEN_LIMIT:
-                    logger.warning(
-                        "Truncated to {} test cases (from {} test cases) due to token limit",
-                        len(selected_tc_ids),
-                        len(valuable_testcase_info),
-                    )
-                    assert len(selected_tc_ids) > 0  # should be at least one test case
-                    return {tc_id: info for info, _, tc_id in selected_tc_ids}
+            valuable_testcase_info.sort(key=itemgetter(1, 2), reverse=True)
+
+            # only count each part separately when truncating
+            reminder_tokens = estimate_text_token(SCHEDULING_FORMAT_REMINDER)
+            info_tokens = {
+                tc_id: estimate_text_token(info)
+                for info, _, tc_id in valuable_testcase_info
+            }
+
+            selected_tc_info: dict[int, str] = {}
+            truncated_tokens = reminder_tokens
+            for info, _, tc_id in valuable_testcase_info:
+                if truncated_tokens + info_tokens[tc_id] > TOKEN_LIMIT:
+                    break
+                truncated_tokens += info_tokens[tc_id]
+                selected_tc_info[tc_id] = info
 
-                truncated_str += info + "\n\n"
-                selected_tc_ids.append((info, weight, tc_id))
-
-            assert False  # should not reach here
+            logger.warning(
+                "Truncated to {} test cases (from {} test cases) due to token limit",
+                len(selected_tc_info),
+                len(valuable_testcase_info),
+            )
+            assert len(selected_tc_info) > 0  # should be at least one test case
+            return selected_tc_info
         else:
             return {tc_id: info for info, _, tc_id in valuable_testcase_info}
 
@@ -933,13 +1144,27 @@ class TestCaseManager:
 
         coverage = Coverage.get_instance()
 
+        # reuse the information if neither the coverage nor the test case changed
+        cache_key = (
+            coverage.epoch,
+            len(tc.execution_trace or ""),
+            tc.get_historical_information(),
+        )
+        if tc._sched_cache is not None and tc._sched_cache[0] == cache_key:
+            return tc._sched_cache[1], tc._sched_cache[2]
+
+        # the information is joined once at the end
+        info_parts: list[str] = []
+
         # 1. Test Case ID
-        info = wrap_between_tags(TestCaseId.__xml_tag__, str(tc.id))
+        info_parts.append(wrap_between_tags(TestCaseId.__xml_tag__, str(tc.id)))
 
         # 2. Source Test Case ID
-        info += wrap_between_tags(
-            SrcTestCaseId.__xml_tag__,
-            str(tc.src_id if tc.src_id is not None else "None"),
+        info_parts.append(
+            wrap_between_tags(
+                SrcTestCaseId.__xml_tag__,
+                str(tc.src_id if tc.src_id is not None else "None"),
+            )
         )
 
         # 3. Path Constraint
@@ -947,87 +1172,79 @@ class TestCaseManager:
             path_constraint = tc.target_path_constraint
         else:
             path_constraint = "None"
-        info += wrap_between_tags(PathConstraint.__xml_tag__, path_constraint)
+        info_parts.append(
+            wrap_between_tags(PathConstraint.__xml_tag__, path_constraint)
+        )
 
         # 4. Execution Information
-        info += wrap_between_tags(ExecutionInformation.__xml_tag__, tc.exec_code)
+        info_parts.append(
+            wrap_between_tags(ExecutionInformation.__xml_tag__, tc.exec_code)
+        )
 
         # 5. Function Call Chain
         func_call_chain = trace_compress(tc.execution_trace)
         func_call_chain_parts = []
-        _file_coverage = []
-        for relative_file_path, func_name, blocks in func_call_chain:
-            relative_file_path = os.path.normpath(relative_file_path)
-
-            file_coverage = coverage.get_file_coverage(relative_file_path)
+        # the same files are usually visited many times in a call chain
+        file_coverages: dict[str, tuple[str, TraceCollector]] = {}
+        for file_path, func_name, blocks in func_call_chain:
+            if file_path not in file_coverages:
+                relative_file_path = os.path.normpath(file_path)
+                file_coverages[file_path] = (
+                    relative_file_path,
+                    coverage.get_file_coverage(relative_file_path),
+                )
+            relative_file_path, file_coverage = file_coverages[file_path]
 
-            _l, _total = file_coverage.get_function_line_cov(func_name)
+            line_cov, exec_block_cov = file_coverage.get_function_cov(func_name, blocks)
 
             func_call_chain_parts.append(
                 (
                     relative_file_path,
                     func_name,
-                    (_l, _total),
-                    file_coverage.get_exec_block_cov(func_name, blocks),
+                    line_cov,
+                    exec_block_cov,
                 )
             )
-            _file_coverage.append(_l / _total)
 
         SHOW_FUNC_NUM = 20
 
         # Generate function call chain string
         if len(func_call_chain_parts) > SHOW_FUNC_NUM:
-            # Ensure the first and last functions are selected
-            first_index = 0
-            last_index = len(func_call_chain_parts) - 1
-
-            # Create a list with indices, excluding the first and last
-            indexed_coverage = [
-                (i, cov)
-                for i, cov in enumerate(_file_coverage)
-                if i != first_index and i != last_index
-            ]
-
-            # Sort by coverage rate from smallest to largest
-            indexed_coverage.sort(key=lambda x: x[1])
-
-            # Get the indices of the SHOW_FUNC_NUM-2 functions with the lowest coverage (if any)
-            middle_indices = [idx for idx, _ in indexed_coverage[: (SHOW_FUNC_NUM - 2)]]
-
-            # Merge indices: first + middle 18 + last
-            lowest_indices = [first_index] + middle_indices + [last_index]
-
-            # Sort by the original order of the function call chain
-            lowest_indices.sort()
+            lowest_indices = _select_lowest_coverage_indices(
+                [part[2] for part in func_call_chain_parts], SHOW_FUNC_NUM
+            )
 
             # Select the functions to display
             selected_parts = [func_call_chain_parts[i] for i in lowest_indices]
 
             # Generate a string with ellipsis
-            func_call_chain_str = f"(The call chain is with {len(func_call_chain_parts)} funcs. Only showing the funcs with lowest coverage in the middle of the chain)\n"
+            chain_parts = [
+                f"(The call chain is with {len(func_call_chain_parts)} funcs. Only showing the funcs with lowest coverage in the middle of the chain)\n"
+            ]
             for i, part in enumerate(selected_parts):
-                if i == 0:
-                    func_call_chain_str += f"{part[0]}[{part[1]} ({math.ceil(part[2][0]/part[2][1]*100)}%)][{math.ceil(part[3][0]/part[3][1]*100)}%]"
-                else:
-                    func_call_chain_str += f"=>{part[0]}[{part[1]} ({math.ceil(part[2][0]/part[2][1]*100)}%)][{math.ceil(part[3][0]/part[3][1]*100)}%]"
+                if i > 0:
+                    chain_parts.append("=>")
+                chain_parts.append(_format_call_chain_part(part))
 
                 # Add "..." in the appropriate position to represent the omitted
                 if (
                     i < len(selected_parts) - 1
                     and lowest_indices[i + 1] - lowest_indices[i] > 1
                 ):
-                    func_call_chain_str += f"=>[..{lowest_indices[i+1]-lowest_indices[i]-1} funcs omitted..]"
+                    chain_parts.append(
+                        f"=>[..{lowest_indices[i+1]-lowest_indices[i]-1} funcs omitted..]"
+                    )
+            func_call_chain_str = "".join(chain_parts)
         else:
             func_call_chain_str = "=>".join(
-                [
-                    f"{part[0]}[{part[1]} ({math.ceil(part[2][0]/part[2][1]*100)}%)][{math.ceil(part[3][0]/part[3][1]*100)}%]"
-                    for part in func_call_chain_parts
-                ]
+                [_format_call_chain_part(part) for part in func_call_chain_parts]
             )
 
-        info += wrap_between_tags(
-            FunctionCallChain.__xml_tag__,
-            func_call_chain_str,
+        info_parts.append(
+            wrap_between_tags(
+                FunctionCallChain.__xml_tag__,
+                func_call_chain_str,
+            )
         )
 
         # 6. Historical Information
@@ -1038,9 +1255,14 @@ class TestCaseManager:
             else 0
         )
         weight = 1 - fail_ratio
-        info += wrap_between_tags(
-            HistoricalInformation.__xml_tag__,
-            f"{historical_fail_info[0]}/{historical_fail_info[1]}({fail_ratio:.1%})",
+        info_parts.append(
+            wrap_between_tags(
+                HistoricalInformation.__xml_tag__,
+                f"{historical_fail_info[0]}/{historical_fail_info[1]}({fail_ratio:.1%})",
+            )
         )
 
-        return info, weight + 1 if tc.new_coverage else 0
+        weight = weight + 1 if tc.new_coverage else 0
+        info = "".join(info_parts)
+        tc._sched_cache = (cache_key, info, weight)
+        return info, weight
@@ -2,7 +2,10 @@
 Tool for requesting additional code from files.
 """
 
+import functools
 import os
+import re
+import stat
 
 from litellm import ChatCompletionToolParam, ChatCompletionToolParamFunctionChunk
 from loguru import logger
@@ -17,7 +20,7 @@ from app.utils.utils import (
     format_code,
     get_comment_token,
     get_project_dir,
-    load_code_from_file,
+    load_code_lines_from_file,
 )
 
 _CODE_REQUEST_DESCRIPTION = f"""Use this tool to request additional code from files to help with branch selection and constraint generation.
@@ -66,6 +69,12 @@ Where:
 - Third column: The actual code content
 """
 
+# "start-end" or a single line number
+LINE_RANGE_PATTERN = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+))?\s*$")
+
+SEGMENT_SEPARATOR = "=" * 20
+WARNINGS_HEADER = "\n\n" + "!" * 20 + "\nWARNINGS:\n" + "!" * 20 + "\n"
+
 # Define the code request tool
 CodeRequestTool = ChatCompletionToolParam(
     type="function",
@@ -100,6 +109,49 @@ CodeRequestTool = ChatCompletionToolParam(
 )
 
 
+def _resolve_path(
+    relative_filepath: str, filepath: str, project_dir: str
+) -> tuple[str, os.stat_result] | None:
+    """
+    Resolve a requested path, trying it relative to the working directory first and
+    then relative to the project directory.
+
+    Returns:
+        The resolved path and its status, or None if the path does not exist
+    """
+    for path in (relative_filepath, os.path.join(project_dir, filepath)):
+        try:
+            return path, os.stat(path)
+        except OSError:
+            continue
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _load_source_code(
+    file_path: str, mtime_ns: int, size: int
+) -> tuple[dict[int, str], str | None]:
+    """
+    Load the source code of a file without instrumentation, together with its language.
+    The modification time and size of the file are only used as part of the cache key,
+    so that the cached code is reloaded once the file is modified.
+
+    Returns:
+        The source code (line number -> line content) and the language of the file
+    """
+    file_language = detect_language(file_path)
+    comment_token = get_comment_token(file_language)
+    source_code = dict(
+        enumerate(
+            delete_instrumentation_from_code(
+                load_code_lines_from_file(file_path), comment_token
+            ),
+            start=1,
+        )
+    )
+    return source_code, file_language
+
+
 def process_code_request(
     file_requests: list[dict] | None, remaining_attempts: int
 ) -> str:
@@ -130,6 +182,11 @@ def process_code_request(
     total_lines_requested = 0
 
     coverage = Coverage.get_instance()
+    project_dir = get_project_dir()
+    # requested path -> resolved path and its status (the same file is often requested many times)
+    resolved_paths: dict[str, tuple[str, os.stat_result] | None] = {}
+    # file -> copyright lines and line coverage, built once for all ranges of the file
+    file_coverages: dict[str, tuple[int, dict[int, int]]] = {}
 
     for file_request in file_requests:
         filepath = file_request.get("filepath")
@@ -148,27 +205,24 @@ def process_code_request(
             had_errors = True
             continue
 
-        file_to_request = None
-
         # This should be relative path since we only provide relative path in the execution trace
         relative_filepath = os.path.normpath(filepath)
-        # try both absolute and relative paths
-        absolute_filepath = os.path.join(get_project_dir(), filepath)
 
-        if not os.path.exists(relative_filepath) and not os.path.exists(
-            absolute_filepath
-        ):
+        if filepath not in resolved_paths:
+            resolved_paths[filepath] = _resolve_path(
+                relative_filepath, filepath, project_dir
+            )
+        resolved = resolved_paths[filepath]
+
+        if resolved is None:
             error_msg = f"Error: '{filepath}' not found. Please check the file path and try again."
             error_messages.append(error_msg)
             logger.info(f"Path not found: {filepath}")
             had_errors = True
             continue
-        elif os.path.exists(relative_filepath):
-            file_to_request = relative_filepath
-        elif os.path.exists(absolute_filepath):
-            file_to_request = absolute_filepath
+        file_to_request, file_stat = resolved
 
-        if os.path.isdir(file_to_request):
+        if stat.S_ISDIR(file_stat.st_mode):
             error_msg = f"Error: '{filepath}' is a directory. Please provide a valid file path. Files in the directory {filepath} contains: {os.listdir(file_to_request)}"
             error_messages.append(error_msg)
             logger.info(f"Requested path '{filepath}' is a directory")
@@ -176,7 +230,9 @@ def process_code_request(
             continue
 
         try:
-            source_code = load_code_from_file(file_to_request)
+            source_code, file_language = _load_source_code(
+                file_to_request, file_stat.st_mtime_ns, file_stat.st_size
+            )
         except Exception as e:
             error_msg = f"Error: Failed to load code from file '{filepath}', ensure the file is textual. Error:\n{e}"
             error_messages.append(error_msg)
@@ -184,9 +240,6 @@ def process_code_request(
             had_errors = True
             continue
 
-        file_language = detect_language(file_to_request)
-        comment_token = get_comment_token(file_language)
-        source_code = delete_instrumentation_from_code(source_code, comment_token)
         total_lines = len(source_code)
 
         # Default to entire file
@@ -194,53 +247,45 @@ def process_code_request(
 
         # Process line range if provided
         if lines_text:
-            line_range = lines_text.split("-")
-            if len(line_range) == 2:
-                try:
-                    start, end = min(int(line_range[0]), int(line_range[1])), max(
-                        int(line_range[0]), int(line_range[1])
-                    )
-
-                    if start > total_lines:
-                        error_msg = f"Line number {start} is greater than the total line number of file '{filepath}' ({total_lines} lines). Thus, we DO NOT return any code."
-                        logger.info(error_msg)
-                        error_messages.append(error_msg)
-                        had_errors = True
-                        continue
-                    # Validate range bounds
-                    elif end > total_lines:
-                        error_msg = f"Line number {end} is greater than the total line number of file '{filepath}' ({total_lines} lines). Thus, we clip the end to the last line."
-                        logger.info(error_msg)
-                        end = total_lines
-                        error_messages.append(error_msg)
-                        had_errors = True
-                        assert start <= end
-
-                except ValueError:
-                    error_msg = f"Error: Invalid line numbers in range '{lines_text}' for file '{filepath}'. Line numbers must be integers."
-                    error_messages.append(error_msg)
-                    logger.info(f"Invalid line numbers in range: {lines_text}")
-                    had_errors = True
-                    continue
-            elif (
-                len(line_range) == 1 and line_range[0].isdigit()
-            ):  # fault tolerance for line number without range
-                start = int(line_range[0])
-                end = start
-            else:
+            line_range = LINE_RANGE_PATTERN.match(lines_text)
+            if line_range is None:
                 error_msg = f"Error: Invalid line range format '{lines_text}' for file '{filepath}'. Expected format is 'start-end'."
                 error_messages.append(error_msg)
                 logger.info(f"Invalid line range format: {lines_text}")
                 had_errors = True
                 continue
 
+            # fault tolerance for line number without range
+            start = int(line_range[1])
+            end = int(line_range[2]) if line_range[2] is not None else start
+            if start > end:
+                start, end = end, start
+
+            if start > total_lines:
+                error_msg = f"Line number {start} is greater than the total line number of file '{filepath}' ({total_lines} lines). Thus, we DO NOT return any code."
+                logger.info(error_msg)
+                error_messages.append(error_msg)
+                had_errors = True
+                continue
+            # Validate range bounds
+            elif end > total_lines:
+                error_msg = f"Line number {end} is greater than the total line number of file '{filepath}' ({total_lines} lines). Thus, we clip the end to the last line."
+                logger.info(error_msg)
+                end = total_lines
+                error_messages.append(error_msg)
+                had_errors = True
+
         # Update the total lines counter
         lines_in_segment = end - start + 1
         total_lines_requested += lines_in_segment
 
-        _copy_right_lines = coverage.get_file_coverage(
-            relative_filepath
-        ).begin_copyright_lines
+        if relative_filepath not in file_coverages:
+            file_coverage = coverage.get_file_coverage(relative_filepath)
+            file_coverages[relative_filepath] = (
+                file_coverage.begin_copyright_lines,
+                file_coverage.get_real_line_coverage(),
+            )
+        _copy_right_lines, line2cov = file_coverages[relative_filepath]
         has_copyright_lines = False
 
         adjusted_start = start
@@ -259,15 +304,28 @@ def process_code_request(
             numbered=True,
             qouted=True,
             range=(adjusted_start, end),
-            line2cov=coverage.get_file_coverage(
-                relative_filepath
-            ).get_real_line_coverage(),
+            line2cov=line2cov,
             numbering_style="prefix",
         )
 
         # Add a more distinctive header for each code segment
-        segment_header = f"{'='*20}\n[FILE: {relative_filepath} ({total_lines} lines total)] [LINES: {start}-{end}]:\n('-' means have NOT been covered, '+' means have been covered{'' if not has_copyright_lines else f', lines {start}-{_copy_right_lines} are omitted due to copyright comments'})\n{'='*20} "
-        code_snippets.append(f"{segment_header}\n{code_segment}")
+        copyright_note = (
+            f", lines {start}-{_copy_right_lines} are omitted due to copyright comments"
+            if has_copyright_lines
+            else ""
+        )
+        code_snippets.append(
+            "".join(
+                (
+                    SEGMENT_SEPARATOR,
+                    f"\n[FILE: {relative_filepath} ({total_lines} lines total)] [LINES: {start}-{end}]:\n",
+                    f"('-' means have NOT been covered, '+' means have been covered{copyright_note})\n",
+                    SEGMENT_SEPARATOR,
+                    " \n",
+                    code_segment,
+                )
+            )
+        )
 
     # Log the total lines requested
     logger.info(f"Total lines of code requested: {total_lines_requested}")
@@ -281,16 +339,11 @@ def process_code_request(
             result = "\n\n".join(error_messages)
         else:
             # If some files were read successfully, append errors at the end
-            result = "\n\n".join(code_snippets)
+            parts = ["\n\n".join(code_snippets)]
             if error_messages:
-                result += (
-                    "\n\n"
-                    + "!" * 20
-                    + "\nWARNINGS:\n"
-                    + "!" * 20
-                    + "\n"
-                    + "\n".join(error_messages)
-                )
+                parts.append(WARNINGS_HEADER)
+                parts.append("\n".join(error_messages))
+            result = "".join(parts)
         logger.info(f"Code request WARNINGS:\n{error_messages}")
     else:
         result = "\n\n".join(code_snippets)
@@ -2,6 +2,7 @@
 Tool for providing function signatures for code instrumentation.
 """
 
+import functools
 import re
 
 from litellm import ChatCompletionToolParam, ChatCompletionToolParamFunctionChunk
@@ -98,8 +99,39 @@ ReportFunctionsTool = ChatCompletionToolParam(
 )
 
 
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
 def normalize_spaces(text):
-    return re.sub(r"\s+", " ", text)
+    return WHITESPACE_PATTERN.sub(" ", text)
+
+
+@functools.lru_cache(maxsize=8)
+def _index_source_code(
+    source_code: str,
+) -> tuple[tuple[str, ...], dict[str, tuple[int, ...]], tuple[int, ...]]:
+    """
+    Index the lines of the source code for matching signatures. The index is cached,
+    as the functions of the same file are usually reported over several calls.
+
+    Returns:
+        - The stripped lines without spaces
+        - Non-empty stripped line -> its line indices (0-indexed), to look up the lines
+          that a signature starts with instead of scanning the whole file
+        - The distinct lengths of the non-empty stripped lines, in ascending order
+    """
+    stripped_lines = [line.strip() for line in source_code.splitlines()]
+    no_space_lines = tuple(line.replace(" ", "") for line in stripped_lines)
+    line_indices: dict[str, list[int]] = {}
+    for line_idx, line in enumerate(stripped_lines):
+        if line:
+            line_indices.setdefault(line, []).append(line_idx)
+    line_lengths = tuple(sorted({len(line) for line in line_indices}))
+    return (
+        no_space_lines,
+        {line: tuple(indices) for line, indices in line_indices.items()},
+        line_lengths,
+    )
 
 
 def process_report_functions(signatures, source_code: str) -> tuple[str, list[int]]:
@@ -139,22 +171,32 @@ def process_report_functions(signatures, source_code: str) -> tuple[str, list[in
     # If source code is provided, verify each signature can be found
     not_found_signatures = []
     found_funcs_signature_lines = []  # 0-indexed line numbers
-    source_code_lines = source_code.splitlines()
+    no_space_lines, line_indices, line_lengths = _index_source_code(source_code)
+
     for signature in signature_list:
         found = False
         _signature = normalize_spaces(signature.strip())
-        for line_idx, line in enumerate(source_code_lines):
-            if len(line.strip()) == 0:
-                continue
-            if _signature.startswith(line.strip()):
-                _real_signature = line.strip()
-                for i in range(1, 10):
-                    if line_idx + i >= len(source_code_lines):
-                        break
-                    _real_signature += source_code_lines[line_idx + i].strip()
-
-                if _signature.replace(" ", "") in _real_signature.replace(
-                    " ", ""
+        _signature_no_space = _signature.replace(" ", "")
+        _sig_len = len(_signature)
+        _sig_no_space_len = len(_signature_no_space)
+        candidate_lines = []
+        # only non-empty lines no longer than the signature can be its prefix
+        for length in line_lengths:
+            if length > _sig_len:
+                break
+            candidate_lines.extend(line_indices.get(_signature[:length], ()))
+        candidate_lines.sort()
+
+        # every matching line is reported, as the same signature may be implemented
+        # several times (e.g., in different preprocessor branches)
+        for line_idx in candidate_lines:
+            # the signature may span the line and the following 9 lines, which are
+            # only appended until the signature is found
+            window = ""
+            for window_line in no_space_lines[line_idx : line_idx + 10]:
+                window += window_line
+                if (
+                    len(window) >= _sig_no_space_len and _signature_no_space in window
                 ):  # relax the matching condition
                     logger.debug(
                         'Found signature: "{}" at line: {}',
@@ -163,6 +205,7 @@ def process_report_functions(signatures, source_code: str) -> tuple[str, list[in
                     )
                     found_funcs_signature_lines.append(line_idx)
                     found = True
+                    break
 
         if not found:
             logger.debug(
@@ -174,9 +217,10 @@ def process_report_functions(signatures, source_code: str) -> tuple[str, list[in
     logger.info("Function signatures processed: {}", signature_list)
 
     if not_found_signatures:
-        not_found_signatures_str = ""
-        for cnt, signature in enumerate(not_found_signatures):
-            not_found_signatures_str += f'{cnt+1}. "{signature}"\n'
+        not_found_signatures_str = "".join(
+            f'{cnt+1}. "{signature}"\n'
+            for cnt, signature in enumerate(not_found_signatures)
+        )
         logger.info(
             "The following signatures could not be found in the source code:\n{}",
             not_found_signatures_str,
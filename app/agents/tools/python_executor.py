@@ -4,8 +4,12 @@ Tool for executing Python code in an isolated environment.
 
 import binascii  # Import binascii for hex conversion
 import os
+import select
+import signal
 import subprocess
 import tempfile
+import threading
+import time
 
 from litellm import ChatCompletionToolParam, ChatCompletionToolParamFunctionChunk
 from loguru import logger
@@ -15,6 +19,17 @@ from app.utils.utils import get_project_dir
 
 EXECUTION_TIMEOUT = 10  # 10 seconds for the Python code execution
 MAX_OUTPUT_CHARS = 10000  # Maximum number of characters to return from stdout/stderr
+# Maximum number of bytes kept from stdout/stderr (a character takes at most 4 bytes),
+# one more byte is kept to tell that the output is truncated
+MAX_OUTPUT_BYTES = MAX_OUTPUT_CHARS * 4
+READ_CHUNK_SIZE = 1 << 16  # 64 KiB
+# Once the process exited, its output is only read for this long, as background
+# processes started by the code may keep the pipes open
+OUTPUT_DRAIN_TIMEOUT = 1
+PIPE_POLL_INTERVAL = 0.1
+# The code is written to a tmpfs (in memory) if available, otherwise to the default
+# temporary directory. A real file keeps `__file__` and the source lines in tracebacks.
+CODE_FILE_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
 
 _PYTHON_EXECUTOR_DESCRIPTION = f"""Use this tool to execute Python code in an isolated environment. This is an INTERMEDIATE tool used to obtain some intermediate results or conclusions. This tool is NOT used to provide the final solution.
 
@@ -57,7 +72,7 @@ def _safe_decode_with_truncation(byte_stream: bytes | None) -> tuple[str, str |
     """
     Attempts to decode a byte stream using UTF-8. If decoding fails,
     it returns a lossy representation (using 'replace') and the hex dump of the original bytes.
-    Both outputs are truncated if too long.
+    Both outputs are truncated if too long, and only the bytes that can be shown are decoded.
 
     Args:
         byte_stream: The byte stream to decode.
@@ -70,38 +85,133 @@ def _safe_decode_with_truncation(byte_stream: bytes | None) -> tuple[str, str |
     if not byte_stream:
         return "", None  # Return empty string, no hex needed
 
-    try:
-        # Try strict decoding first to detect errors
-        decoded_string = byte_stream.decode("utf-8", errors="strict")
-        # Truncate if necessary
-        if len(decoded_string) > MAX_OUTPUT_CHARS:
-            decoded_string = decoded_string[:MAX_OUTPUT_CHARS]
-            decoded_string += (
-                f"\n[... output truncated after {MAX_OUTPUT_CHARS} characters ...]"
-            )
+    # Only this prefix can end up in the output
+    prefix = byte_stream[:MAX_OUTPUT_BYTES]
+
+    if prefix.isascii():
+        # Fast path for the common pure-ASCII output: one byte per character, no errors
+        decoded_string = prefix[:MAX_OUTPUT_CHARS].decode("ascii")
+        truncated = len(byte_stream) > MAX_OUTPUT_CHARS
+        has_errors = False
+    else:
+        # Decode only once, replacing invalid bytes
+        decoded_string = prefix.decode("utf-8", errors="replace")
+        truncated = (
+            len(byte_stream) > MAX_OUTPUT_BYTES
+            or len(decoded_string) > MAX_OUTPUT_CHARS
+        )
+        # a character cut at the end of the prefix is always beyond MAX_OUTPUT_CHARS
+        decoded_string = decoded_string[:MAX_OUTPUT_CHARS]
+        has_errors = "\ufffd" in decoded_string
+    # Truncate if necessary
+    if truncated:
+        decoded_string += (
+            f"\n[... output truncated after {MAX_OUTPUT_CHARS} characters ...]"
+        )
+
+    if not has_errors:
         return decoded_string, None  # Success, no hex dump needed
-    except UnicodeDecodeError:
-        # Decoding failed, decode again with replacement characters
-        lossy_string = byte_stream.decode("utf-8", errors="replace")
-        # Truncate if necessary
-        if len(lossy_string) > MAX_OUTPUT_CHARS:
-            lossy_string = lossy_string[:MAX_OUTPUT_CHARS]
-            lossy_string += (
-                f"\n[... output truncated after {MAX_OUTPUT_CHARS} characters ...]"
-            )
 
-        # Get the hex dump
-        hex_representation = binascii.hexlify(byte_stream).decode("ascii")
-        # Truncate hex - allow twice as many characters since each byte becomes two hex chars
-        hex_limit = MAX_OUTPUT_CHARS * 2
-        if len(hex_representation) > hex_limit:
-            hex_representation = hex_representation[:hex_limit]
-            hex_representation += (
-                f"\n[... hex output truncated after {hex_limit} characters ...]"
-            )
+    # Get the hex dump, only of the bytes that are shown
+    # (allow twice as many characters since each byte becomes two hex chars)
+    hex_limit = MAX_OUTPUT_CHARS * 2
+    hex_representation = binascii.hexlify(byte_stream[:MAX_OUTPUT_CHARS]).decode(
+        "ascii"
+    )
+    if len(byte_stream) > MAX_OUTPUT_CHARS:
+        hex_representation += (
+            f"\n[... hex output truncated after {hex_limit} characters ...]"
+        )
+
+    # Return the lossy string AND the hex dump
+    return decoded_string, hex_representation
+
 
-        # Return the lossy string AND the hex dump
-        return lossy_string, hex_representation
+def _drain_pipe(pipe, buffer: bytearray, stop: threading.Event) -> None:
+    """
+    Read a pipe until EOF or until stopped, only keeping the first MAX_OUTPUT_BYTES + 1
+    bytes, so that the child process never blocks on a full pipe.
+    """
+    with pipe:
+        fd = pipe.fileno()
+        while not stop.is_set():
+            if not select.select([fd], [], [], PIPE_POLL_INTERVAL)[0]:
+                continue
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(buffer) <= MAX_OUTPUT_BYTES:
+                buffer += chunk[: MAX_OUTPUT_BYTES + 1 - len(buffer)]
+
+
+def _kill_process_group(process: subprocess.Popen) -> None:
+    """Kill the process and all processes it started in its session"""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass  # all of them already exited
+
+
+def _run_with_bounded_output(
+    args: list[str], timeout: float, cwd: str | None
+) -> tuple[int, bytes, bytes]:
+    """
+    Run a command like `subprocess.run(args, capture_output=True)`, but only keep the
+    beginning of stdout/stderr that can be returned, so that huge outputs are never
+    buffered in memory. The command runs in a new session, so that the processes it
+    starts are killed with it on timeout, and background processes holding the pipes
+    open never delay the return.
+
+    Args:
+        args: The command to run
+        timeout: The timeout in seconds
+        cwd: The working directory
+
+    Returns:
+        The return code, and the (bounded) stdout and stderr bytes
+
+    Raises:
+        subprocess.TimeoutExpired: If the command timed out (with the captured output)
+    """
+    stdout, stderr = bytearray(), bytearray()
+    stop_reading = threading.Event()
+    timed_out = False
+    with subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        start_new_session=True,
+    ) as process:
+        readers = [
+            threading.Thread(
+                target=_drain_pipe, args=(pipe, buffer, stop_reading), daemon=True
+            )
+            for pipe, buffer in ((process.stdout, stdout), (process.stderr, stderr))
+        ]
+        for reader in readers:
+            reader.start()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill_process_group(process)
+            process.wait()
+        finally:
+            # read the remaining output for a bounded time, then stop reading
+            # (the readers close the pipes)
+            drain_deadline = time.monotonic() + OUTPUT_DRAIN_TIMEOUT
+            for reader in readers:
+                reader.join(max(0, drain_deadline - time.monotonic()))
+            stop_reading.set()
+            for reader in readers:
+                reader.join()
+
+    if timed_out:
+        raise subprocess.TimeoutExpired(
+            args, timeout, output=bytes(stdout), stderr=bytes(stderr)
+        )
+    return process.returncode, bytes(stdout), bytes(stderr)
 
 
 def _format_execution_error(
@@ -156,16 +266,21 @@ def process_python_executor(python_code: str | None) -> tuple[str, bool]:
             False,
         )
 
-    temp_file = None
+    code_file = None
 
     logger.debug("LLM requested to execute Python code:\n{}", python_code)
 
     try:
         # Create temporary file
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as f:
-            f.write(python_code)
-            f.flush()
-            temp_file = f.name
+        fd, code_file = tempfile.mkstemp(suffix=".py", dir=CODE_FILE_DIR)
+        try:
+            code_bytes = memoryview(
+                python_code.encode("utf-8", errors="surrogateescape")
+            )
+            while code_bytes:
+                code_bytes = code_bytes[os.write(fd, code_bytes) :]
+        finally:
+            os.close(fd)
 
         # Get project directory if set
         project_dir = get_project_dir()
@@ -175,9 +290,8 @@ def process_python_executor(python_code: str | None) -> tuple[str, bool]:
             logger.debug("No project directory set, using current directory")
 
         # Execute code in subprocess with specified working directory
-        result = subprocess.run(
-            ["python3", temp_file],
-            capture_output=True,  # Capture raw bytes
+        returncode, stdout_bytes, stderr_bytes = _run_with_bounded_output(
+            ["python3", code_file],
             timeout=EXECUTION_TIMEOUT,
             cwd=(
                 project_dir if project_dir else None
@@ -185,9 +299,9 @@ def process_python_executor(python_code: str | None) -> tuple[str, bool]:
         )
 
         # Decode stdout and stderr safely
-        stdout_str, stdout_hex_dump = _safe_decode_with_truncation(result.stdout)
+        stdout_str, stdout_hex_dump = _safe_decode_with_truncation(stdout_bytes)
 
-        if result.returncode == 0:
+        if returncode == 0:
             result_msg = "Python execution succeeded.\n"
 
             if stdout_str.strip():
@@ -203,9 +317,9 @@ def process_python_executor(python_code: str | None) -> tuple[str, bool]:
         else:
             # Format error using the helper function
             error_msg = _format_execution_error(
-                f"Python execution failed with return code {result.returncode}.\n",
-                result.stdout,
-                result.stderr,
+                f"Python execution failed with return code {returncode}.\n",
+                stdout_bytes,
+                stderr_bytes,
             )
             logger.info(error_msg)
             return error_msg, False
@@ -225,8 +339,8 @@ def process_python_executor(python_code: str | None) -> tuple[str, bool]:
         return error_msg, False
     finally:
         # Clean up temporary file if it exists
-        if temp_file:
+        if code_file:
             try:
-                os.unlink(temp_file)
+                os.unlink(code_file)
             except OSError:
                 pass  # Ignore deletion errors
@@ -2,6 +2,9 @@
 Tool for providing the final solution in concolic execution.
 """
 
+import threading
+from collections import OrderedDict
+
 from litellm import ChatCompletionToolParam, ChatCompletionToolParamFunctionChunk
 from loguru import logger
 
@@ -23,6 +26,13 @@ The Python function must:
 - Handle execution failures appropriately: raise exceptions for any execution issues.
 """
 
+VALIDATED_CACHE_SIZE = 256
+
+# Python executions that already ran successfully, reviews often return the same one again.
+# Running it again would only spawn another target process with the same outcome.
+_validated_executions: OrderedDict[str, None] = OrderedDict()
+_validated_executions_lock = threading.Lock()
+
 # Define the solution tool
 ReviewSolveAnswerTool = ChatCompletionToolParam(
     type="function",
@@ -84,6 +94,14 @@ def process_review_solve_answer(
             logger.warning(error_msg)
             return error_msg, need_adjust, None
 
+        with _validated_executions_lock:
+            validated = new_python_execution in _validated_executions
+            if validated:
+                _validated_executions.move_to_end(new_python_execution)
+        if validated:
+            logger.info("New solution accepted (already validated).")
+            return "New solution accepted.", need_adjust, new_python_execution
+
         # Verify if the Python execution runs successfully using run_target
         result = run_target(
             new_python_execution, timeout=2
@@ -97,5 +115,9 @@ def process_review_solve_answer(
             return error_msg, need_adjust, None
 
         else:
+            with _validated_executions_lock:
+                _validated_executions[new_python_execution] = None
+                if len(_validated_executions) > VALIDATED_CACHE_SIZE:
+                    _validated_executions.popitem(last=False)
             logger.info("New solution accepted.")
             return "New solution accepted.", need_adjust, new_python_execution
@@ -2,13 +2,24 @@
 Tool for solving SMT constraints in concolic execution.
 """
 
+import ast
+import atexit
+import functools
+import re
+import shelve
+import textwrap
+import threading
+import types
+from collections import OrderedDict, deque
+from operator import itemgetter
+
 import z3
 from litellm import ChatCompletionToolParam, ChatCompletionToolParamFunctionChunk
 from loguru import logger
 
 _SMT_SOLVER_DESCRIPTION = """Use this tool to solve SMT (Satisfiability Modulo Theories) constraints using Z3 solver.
 
-This tool supports two input formats:
+This tool supports three input formats:
 
 FORMAT 1: DIRECT Z3 Python API expression (RECOMMENDED)
 - DIRECTLY provide the Z3 expression without any code block markers (no triple backticks)
@@ -50,6 +61,16 @@ FORMAT 2: Code Block with Final Constraint (FOR COMPLEX CONSTRAINT BUILDING)
   final_constraint = z3.And(*constraints)
   ```
 
+FORMAT 3: SMT-LIB2 script
+- Declare all variables and provide the constraints with (assert ...) commands, which are parsed natively by Z3
+- Commands such as (check-sat) and (get-model) are not required
+- Example:
+  (declare-const x Int)
+  (declare-const y Int)
+  (assert (> x 0))
+  (assert (< y 10))
+  (assert (= (+ x y) 7))
+
 The solver will return:
 - If satisfiable: variable assignments that satisfy the constraints (one valid solution)
 - If unsatisfiable: an error message indicating the constraints cannot be satisfied
@@ -58,6 +79,55 @@ The solver will return:
 The solver has a 10-second timeout. For complex constraints, consider simplifying or decomposing them.
 """
 
+# A markdown code block: the opening triple backticks with the rest of their line (e.g.,
+# a language hint), the code, and everything from the last triple backticks (if any)
+CODE_BLOCK_PATTERN = re.compile(r"\A```[^\n]*\n(.*?)(?:```(?!.*```).*)?\Z", re.DOTALL)
+
+SOLVER_TIMEOUT_MS = 10000  # 10 seconds for each satisfiability check
+SOLVE_CACHE_SIZE = 4096
+# Path of a shelve file to keep the cached results across runs (disabled if None)
+PERSISTENT_SOLVE_CACHE_FILE: str | None = None
+
+# Concolic exploration often sends the same constraints to the solver again (e.g., on
+# retries), so definite (sat/unsat) results are cached by the SMT-LIB2 text of the
+# constraint with canonical variable names: its declarations and assertion ->
+# (solution as (canonical variable name, value) pairs, error message)
+_solve_cache: OrderedDict[str, tuple[list[tuple[str, str]], str]] = OrderedDict()
+_solve_cache_lock = threading.Lock()
+_persistent_solve_cache: shelve.Shelf | None = None
+
+SOLVER_TACTICS = ("simplify", "propagate-values", "solve-eqs", "smt")
+# Solve large conjunctions with Z3's parallel SMT tactic. Disabled by default, as the
+# tool is already called from several threads at once.
+PARALLEL_SOLVING = False
+PARALLEL_MIN_CONJUNCTS = 8
+
+# Type of a model value -> conversion to the Python value shown in the solution, other
+# values (e.g., rationals, bit-vectors and functions) are shown as they are printed by Z3
+_MODEL_VALUE_CONVERTERS = {
+    z3.IntNumRef: z3.IntNumRef.as_long,
+    # Get real number approximation
+    z3.AlgebraicNumRef: lambda value: float(value.approx(10).as_fraction()),
+    # boolean values in a model are either true or false
+    z3.BoolRef: z3.is_true,
+}
+
+CONSTRAINT_CACHE_SIZE = 1024
+
+# Stripped constraints -> the constraint built from them, to skip evaluating the same
+# constraints again (e.g., in retry or review loops)
+_constraint_cache: OrderedDict[str, z3.BoolRef] = OrderedDict()
+_constraint_cache_lock = threading.Lock()
+
+# Each thread reuses its own solver
+_thread_local = threading.local()
+
+UNSAT_CORE_CACHE_SIZE = 1024
+# Unsatisfiable cores of previous checks, as the SMT-LIB2 texts of their conjuncts.
+# A constraint containing all conjuncts of a core is unsatisfiable without checking it.
+_unsat_cores: deque[frozenset[str]] = deque(maxlen=UNSAT_CORE_CACHE_SIZE)
+_unsat_cores_lock = threading.Lock()
+
 # Define the SMT solver tool
 SMTSolverTool = ChatCompletionToolParam(
     type="function",
@@ -69,7 +139,7 @@ SMTSolverTool = ChatCompletionToolParam(
             "properties": {
                 "smt_constraints": {
                     "type": "string",
-                    "description": "The SMT constraints in Z3 Python API format",
+                    "description": "The SMT constraints in Z3 Python API format or as an SMT-LIB2 script",
                 }
             },
             "required": ["smt_constraints"],
@@ -78,203 +148,219 @@ SMTSolverTool = ChatCompletionToolParam(
 )
 
 
-def process_smt_solver(smt_constraints: str | None) -> tuple[str, bool]:
+class _ImportRemover(ast.NodeTransformer):
+    """Replace all import statements of a code block with `pass`"""
+
+    def visit_Import(self, node: ast.Import) -> ast.Pass:
+        return ast.copy_location(ast.Pass(), node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> ast.Pass:
+        return ast.copy_location(ast.Pass(), node)
+
+
+def _fix_indentation(code: str) -> str:
     """
-    Process SMT solver tool by calling Z3 to solve constraints.
+    Remove the common indentation of a code block whose first line has lost its
+    indentation (e.g., when the code block is stripped).
+    """
+    first_line, _, rest = code.partition("\n")
+    return f"{first_line}\n{textwrap.dedent(rest)}"
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_constraints(smt_constraints: str) -> tuple[types.CodeType, bool]:
+    """
+    Parse and compile the constraints once, as the same constraints are often provided
+    again (e.g., on retries).
 
     Args:
-        smt_constraints: The constraints in Z3 Python API format or a structured code block
+        smt_constraints: The constraints without code block markers
 
     Returns:
-        Tuple of (result message, satisfiable && execution_succeeded)
-    """
-    logger.info(f"Solving SMT constraints:\n{smt_constraints}")
-    if not smt_constraints or not smt_constraints.strip():
-        logger.warning("`smt_constraints` is not provided or it is empty.")
-        return (
-            "Error: `smt_constraints` is not provided or it is empty. Please provide a valid `smt_constraints`.",
-            False,
-        )
+        Tuple of (code object, whether it is a single expression to evaluate (FORMAT 1)
+        rather than a code block to execute (FORMAT 2))
 
-    result_str = ""
-    err_msg = ""
+    Raises:
+        SyntaxError: If the constraints cannot be parsed
+    """
     try:
-        # Create Z3 solver and set timeout
-        solver = z3.Solver()
-        solver.set("timeout", 10000)  # Set 10 second timeout (in milliseconds)
+        tree = ast.parse(smt_constraints)
+    except SyntaxError:
+        tree = ast.parse(_fix_indentation(smt_constraints))
 
-        # Clean up the constraints - strip any code block markers
-        smt_constraints = smt_constraints.strip()
+    if len(tree.body) == 1 and isinstance(tree.body[0], ast.Expr):
+        expression = ast.Expression(tree.body[0].value)
+        return compile(expression, "<smt_constraints>", "eval"), True
 
-        # Remove possible markdown code block markers
-        if smt_constraints.startswith("```"):
-            # Find the end of the first line to remove language hint if present
-            first_line_end = smt_constraints.find("\n")
-            if first_line_end > 0:
-                smt_constraints = smt_constraints[first_line_end + 1 :]
+    # Remove any import statements for security, the tree is only walked if there may be any
+    if "import" in smt_constraints:
+        tree = ast.fix_missing_locations(_ImportRemover().visit(tree))
+    return compile(tree, "<smt_constraints>", "exec"), False
 
-            # Find and remove ending triple backticks
-            end_marker = smt_constraints.rfind("```")
-            if end_marker > 0:
-                smt_constraints = smt_constraints[:end_marker]
 
-        # Ensure the string is stripped again after removing markers
-        smt_constraints = smt_constraints.strip()
+def _constraint_key(constraint: z3.BoolRef) -> str:
+    """
+    Get the SMT-LIB2 text of a constraint, including the declarations of its variables,
+    so that variables with the same name but different sorts never collide.
+    """
+    solver = z3.Solver()
+    solver.add(constraint)
+    return solver.sexpr()
+
 
-        # Determine which format is being used
-        # FORMAT 1: Any expression that doesn't contain variable assignments and starts with z3.
-        # FORMAT 2: Code block with assignments ending with final_constraint assignment
-
-        # Check if it's likely to be FORMAT 1 (direct Z3 expression)
-        is_format1 = False
-        lines = smt_constraints.split("\n")
-        non_empty_lines = [
-            line.strip()
-            for line in lines
-            if line.strip() and not line.strip().startswith("#")
-        ]
-
-        # If every non-empty line either starts with z3. or is continuation of expression (starts with operators/brackets)
-        if non_empty_lines and (
-            all(
-                line.strip().startswith("z3.")
-                or line.strip().startswith("(")
-                or line.strip().startswith(")")
-                or line.strip().startswith(",")
-                or line.strip().startswith("&&")
-                or line.strip().startswith("||")
-                or line.strip().startswith("and ")
-                or line.strip().startswith("or ")
-                or line.strip().startswith("+")
-                or line.strip().startswith("-")
-                or line.strip().startswith("*")
-                or line.strip().startswith("/")
-                or line.strip().startswith("==")
-                or line.strip().startswith("!=")
-                or line.strip().startswith("<")
-                or line.strip().startswith(">")
-                for line in non_empty_lines
-            )
-        ):
-            is_format1 = True
-
-        if is_format1:
-            # Direct Z3 expression (FORMAT 1) - use standard eval
-            # Join all lines to handle multi-line expressions
-            constraint = eval(smt_constraints, {"z3": z3})
+def _canonicalize(constraint: z3.BoolRef) -> tuple[z3.BoolRef, dict[str, str]]:
+    """
+    Rename the variables of a constraint to v!0, v!1, ... in the order they first appear,
+    so that constraints that only differ in the chosen variable names share a cache key.
+
+    Returns:
+        Tuple of (renamed constraint, variable name -> canonical name)
+    """
+    variables = []
+    visited = set()
+    pending = [constraint]
+    while pending:
+        expr = pending.pop()
+        if expr.get_id() in visited:
+            continue
+        visited.add(expr.get_id())
+        if z3.is_const(expr) and expr.decl().kind() == z3.Z3_OP_UNINTERPRETED:
+            variables.append(expr)
         else:
-            # Multi-line code block (FORMAT 2) - execute it in a controlled environment
-            # Remove any import statements for security and fix indentation
-            code_lines = []
-            for line in lines:
-                if line.strip().startswith("import") or line.strip().startswith("from"):
-                    # Skip all import statements
-                    continue
-                code_lines.append(line)
-
-            # Fix indentation using a more robust approach
-            if code_lines:
-                # Only consider lines that have content and aren't just comments
-                non_empty_lines = []
-                for line in code_lines:
-                    stripped = line.strip()
-                    if stripped and not stripped.startswith("#"):
-                        non_empty_lines.append(line)
-
-                if non_empty_lines:
-                    # Calculate leading spaces for each non-empty line
-                    leading_spaces = []
-                    for line in non_empty_lines:
-                        spaces = len(line) - len(line.lstrip())
-                        leading_spaces.append(spaces)
-
-                    # Get the minimum non-zero indent level
-                    min_indent = (
-                        min(spaces for spaces in leading_spaces if spaces > 0)
-                        if any(spaces > 0 for spaces in leading_spaces)
-                        else 0
-                    )
-
-                    # If we found a minimum indent, remove it from all lines
-                    if min_indent > 0:
-                        fixed_lines = []
-                        for line in code_lines:
-                            if line.strip():  # only process non-empty lines
-                                current_indent = len(line) - len(line.lstrip())
-                                if current_indent >= min_indent:
-                                    fixed_lines.append(line[min_indent:])
-                                else:
-                                    fixed_lines.append(
-                                        line
-                                    )  # keep original if indentation is less
-                            else:
-                                fixed_lines.append(line)  # keep empty lines as is
-                        code_lines = fixed_lines
-
-            # Join lines and execute
-            code = "\n".join(code_lines)
-
-            # Execute the code with limited global namespace
-            global_vars = {"z3": z3}
-            local_vars = {}
-
-            try:
-                exec(code, global_vars, local_vars)
-
-                # Get the constraint from the required variable name
-                if "final_constraint" not in local_vars:
-                    err_msg = "Missing required 'final_constraint' variable in code block. You must assign your final constraint to 'final_constraint'."
-
-                else:
-                    constraint = local_vars["final_constraint"]
-                    if not isinstance(constraint, z3.BoolRef):
-                        err_msg = "The 'final_constraint' variable must be a Z3 boolean expression."
-
-            except Exception as e:
-                err_msg = f"Error executing provided code block: {str(e)}"
-
-        if err_msg:
-            logger.info(f"SMT solver error:\n{err_msg}")
-            return err_msg, False
-
-        # Add constraints
-        solver.add(constraint)
+            pending.extend(reversed(expr.children()))
+
+    names = {str(variable) for variable in variables}
+    if not variables or len(names) < len(variables):
+        # variables with the same name but different sorts are not renamed
+        return constraint, {}
+
+    renaming = {str(variable): f"v!{i}" for i, variable in enumerate(variables)}
+    renamed = z3.substitute(
+        constraint,
+        *(
+            (variable, z3.Const(renaming[str(variable)], variable.sort()))
+            for variable in variables
+        ),
+    )
+    return renamed, renaming
+
+
+def _get_cached_result(cache_key: str) -> tuple[list[tuple[str, str]], str] | None:
+    """Get the cached result of a constraint, from memory or from the persistent cache"""
+    global _persistent_solve_cache
+    with _solve_cache_lock:
+        cached = _solve_cache.get(cache_key)
+        if cached is not None:
+            _solve_cache.move_to_end(cache_key)
+            return cached
+        if PERSISTENT_SOLVE_CACHE_FILE is None:
+            return None
+        if _persistent_solve_cache is None:
+            _persistent_solve_cache = shelve.open(PERSISTENT_SOLVE_CACHE_FILE)
+            atexit.register(_persistent_solve_cache.close)
+        return _persistent_solve_cache.get(cache_key)
+
+
+def _cache_result(cache_key: str, result: tuple[list[tuple[str, str]], str]) -> None:
+    """Cache the result of a constraint, also in the persistent cache if enabled"""
+    with _solve_cache_lock:
+        _solve_cache[cache_key] = result
+        if len(_solve_cache) > SOLVE_CACHE_SIZE:
+            _solve_cache.popitem(last=False)
+        if _persistent_solve_cache is not None:
+            _persistent_solve_cache[cache_key] = result
+
+
+def _format_solution(solution: list[tuple[str, str]]) -> str:
+    """Format the (variable name, value) pairs of a solution, sorted by variable name"""
+    return "\n".join(
+        f"{var_name} = {var_value}"
+        for var_name, var_value in sorted(solution, key=itemgetter(0))
+    )
+
+
+def _create_solver(tactic: z3.Tactic) -> z3.Solver:
+    """Create a Z3 solver from a tactic, with the timeout and unsat cores enabled"""
+    solver = tactic.solver()
+    solver.set("timeout", SOLVER_TIMEOUT_MS)
+    solver.set("unsat_core", True)
+    return solver
+
+
+def _get_solver() -> z3.Solver:
+    """
+    Get the Z3 solver of the current thread. It is reused across checks only to skip
+    building the tactic and solver each time: a tactic solver is not incremental, so
+    every check is solved from scratch and nothing is learned across checks.
+    """
+    solver = getattr(_thread_local, "solver", None)
+    if solver is None:
+        # Most constraints are discharged by the cheap preprocessing tactics,
+        # only the rest goes through the full SMT engine
+        solver = _create_solver(z3.Then(*SOLVER_TACTICS))
+        _thread_local.solver = solver
+    return solver
+
+
+def _solve_constraint(
+    constraint: z3.BoolRef,
+) -> tuple[z3.CheckSatResult, list[tuple[str, str]], str]:
+    """
+    Check the satisfiability of a constraint with Z3.
+
+    Returns:
+        Tuple of (check result, (variable name, value) pairs if satisfiable,
+        error message otherwise)
+    """
+    solution = []
+    err_msg = ""
+
+    conjuncts = constraint.children() if z3.is_and(constraint) else [constraint]
+    conjunct_keys = [_constraint_key(conjunct) for conjunct in conjuncts]
+    conjunct_key_set = frozenset(conjunct_keys)
+    with _unsat_cores_lock:
+        subsumed = any(core <= conjunct_key_set for core in _unsat_cores)
+    if subsumed:
+        logger.info("SMT solver result: unsatisfiable (subsumed by a known unsat core)")
+        return z3.unsat, solution, "Constraints unsatisfiable."
+
+    if PARALLEL_SOLVING and len(conjuncts) >= PARALLEL_MIN_CONJUNCTS:
+        solver = _create_solver(z3.Tactic("psmt"))
+    else:
+        solver = _get_solver()
+    # The constraint is only asserted in a new scope of the reused solver
+    solver.push()
+    try:
+        # Add constraints, each conjunct is tracked by a fresh boolean for the unsat core
+        trackers = {}
+        for conjunct, conjunct_key in zip(conjuncts, conjunct_keys):
+            tracker = z3.FreshBool()
+            trackers[tracker.decl().name()] = conjunct_key
+            solver.assert_and_track(conjunct, tracker)
 
         # Check satisfiability
         result = solver.check()
 
         if result == z3.sat:
             model = solver.model()
-            solution = []
-            # Collect all variables
-            variables = {}
+            # Collect all variables as (name, value) pairs
             for decl in model:
                 var_name = decl.name()
+                if var_name in trackers:
+                    continue
                 var_value = model[decl]
                 # Handle different value types
-                if z3.is_int_value(var_value):
-                    variables[var_name] = var_value.as_long()
-                elif z3.is_algebraic_value(var_value):
-                    variables[var_name] = float(
-                        var_value.approx(10)
-                    )  # Get real number approximation
-                elif z3.is_true(var_value):
-                    variables[var_name] = True
-                elif z3.is_false(var_value):
-                    variables[var_name] = False
-                else:
-                    variables[var_name] = var_value
-
-            # Sort output by variable name
-            for var in sorted(variables.keys()):
-                solution.append(f"{var} = {variables[var]}")
-
-            result_str = "\n".join(solution)
-            logger.info(f"SMT solver found solution:\n{result_str}")
+                convert = _MODEL_VALUE_CONVERTERS.get(type(var_value))
+                if convert is not None:
+                    var_value = convert(var_value)
+                solution.append((var_name, str(var_value)))
 
         elif result == z3.unsat:
             err_msg = "Constraints unsatisfiable."
             logger.info("SMT solver result: unsatisfiable")
+            core = frozenset(trackers[str(tracker)] for tracker in solver.unsat_core())
+            with _unsat_cores_lock:
+                _unsat_cores.append(core)
         else:  # unknown
             reason = solver.reason_unknown()
             # Enhanced timeout detection logic
@@ -282,11 +368,147 @@ def process_smt_solver(smt_constraints: str | None) -> tuple[str, bool]:
                 err_msg = "Solver timeout (10 seconds)."
             else:
                 err_msg = f"Solver could not determine result. Reason: {reason}"
-            logger.info(f"SMT solver result: unknown - {reason}")
+            logger.info("SMT solver result: unknown - {}", reason)
+    finally:
+        solver.pop()
+
+    return result, solution, err_msg
+
+
+def _build_constraint(smt_constraints: str) -> tuple[z3.BoolRef | None, str]:
+    """
+    Build the Z3 constraint from the constraints in any of the formats.
+
+    Args:
+        smt_constraints: The constraints without code block markers
+
+    Returns:
+        Tuple of (constraint, error message if the constraints do not provide a valid one)
+    """
+    constraint = None
+    err_msg = ""
+
+    # SMT-LIB2 script (FORMAT 3) - parsed by Z3 without evaluating any Python code
+    if smt_constraints.startswith("(") and "(assert" in smt_constraints:
+        try:
+            assertions = z3.parse_smt2_string(smt_constraints)
+        except z3.Z3Exception as e:
+            reason = e.value.decode() if isinstance(e.value, bytes) else e.value
+            return None, f"Error parsing SMT-LIB2 constraints: {reason}"
+        return z3.And(*assertions), err_msg
+
+    # Determine which format is being used
+    # FORMAT 1: A single Z3 expression, which is evaluated directly
+    # FORMAT 2: Code block with assignments ending with final_constraint assignment
+    code, is_format1 = _compile_constraints(smt_constraints)
+
+    if is_format1:
+        # Direct Z3 expression (FORMAT 1)
+        constraint = eval(code, {"z3": z3})
+    else:
+        # Multi-line code block (FORMAT 2) - execute it in a controlled environment
+        # Execute the code with limited global namespace
+        global_vars = {"z3": z3}
+        local_vars = {}
+
+        try:
+            exec(code, global_vars, local_vars)
+
+            # Get the constraint from the required variable name
+            if "final_constraint" not in local_vars:
+                err_msg = "Missing required 'final_constraint' variable in code block. You must assign your final constraint to 'final_constraint'."
+
+            else:
+                constraint = local_vars["final_constraint"]
+                if not isinstance(constraint, z3.BoolRef):
+                    err_msg = "The 'final_constraint' variable must be a Z3 boolean expression."
+
+        except Exception as e:
+            err_msg = f"Error executing provided code block: {str(e)}"
+
+    return constraint, err_msg
+
+
+def process_smt_solver(smt_constraints: str | None) -> tuple[str, bool]:
+    """
+    Process SMT solver tool by calling Z3 to solve constraints.
+
+    Args:
+        smt_constraints: The constraints in Z3 Python API format, a structured code block
+            or an SMT-LIB2 script
+
+    Returns:
+        Tuple of (result message, satisfiable && execution_succeeded)
+    """
+    logger.info("Solving SMT constraints:\n{}", smt_constraints)
+    if not smt_constraints or not smt_constraints.strip():
+        logger.warning("`smt_constraints` is not provided or it is empty.")
+        return (
+            "Error: `smt_constraints` is not provided or it is empty. Please provide a valid `smt_constraints`.",
+            False,
+        )
+
+    result_str = ""
+    err_msg = ""
+    try:
+        # Clean up the constraints - strip any code block markers
+        smt_constraints = smt_constraints.strip()
+
+        # Remove possible markdown code block markers
+        code_block = CODE_BLOCK_PATTERN.match(smt_constraints)
+        if code_block is not None:
+            smt_constraints = code_block[1]
+
+        # Ensure the string is stripped again after removing markers
+        smt_constraints = smt_constraints.strip()
+
+        with _constraint_cache_lock:
+            constraint = _constraint_cache.get(smt_constraints)
+            if constraint is not None:
+                _constraint_cache.move_to_end(smt_constraints)
+
+        if constraint is None:
+            constraint, err_msg = _build_constraint(smt_constraints)
+            if err_msg:
+                logger.info("SMT solver error:\n{}", err_msg)
+                return err_msg, False
+            with _constraint_cache_lock:
+                _constraint_cache[smt_constraints] = constraint
+                if len(_constraint_cache) > CONSTRAINT_CACHE_SIZE:
+                    _constraint_cache.popitem(last=False)
+
+        canonical_constraint, renaming = _canonicalize(constraint)
+        cache_key = _constraint_key(canonical_constraint)
+        cached = _get_cached_result(cache_key)
+
+        if cached is not None:
+            canonical_solution, err_msg = cached
+            original_names = {
+                canonical_name: var_name
+                for var_name, canonical_name in renaming.items()
+            }
+            solution = [
+                (original_names.get(var_name, var_name), var_value)
+                for var_name, var_value in canonical_solution
+            ]
+            logger.info("SMT solver result reused from an equivalent constraint")
+        else:
+            result, solution, err_msg = _solve_constraint(constraint)
+            # unknown results (e.g., timeouts) may differ in later checks
+            if result != z3.unknown:
+                canonical_solution = [
+                    (renaming.get(var_name, var_name), var_value)
+                    for var_name, var_value in solution
+                ]
+                _cache_result(cache_key, (canonical_solution, err_msg))
+
+        if solution:
+            result_str = _format_solution(solution)
+            logger.info("SMT solver found solution:\n{}", result_str)
 
     except Exception as e:
         err_msg = f"Z3 solving error:\n {str(e)}"
-        logger.warning(f"Exception in SMT solver: {e}")
+        logger.warning("Exception in SMT solver: {}", e)
 
     if result_str:
         assert err_msg == ""
@@ -1,3 +1,4 @@
+import copy
 import re
 
 from loguru import logger
@@ -12,7 +13,7 @@ from app.utils.utils import (
     format_code,
     get_comment_token,
     get_multiline_comment_tokens,
-    load_code_from_file,
+    load_code_lines_from_file,
 )
 
 GLOBAL_BLOCK = ("Global", 0)
@@ -27,8 +28,13 @@ class TraceCollector:
         self.multiline_comment_tokens: tuple[str, str] | tuple[None, None] = (
             get_multiline_comment_tokens(self.language)
         )
-        self.line2code: dict[int, str] = delete_instrumentation_comments(
-            load_code_from_file(self.file_path), self.comment_token
+        self.line2code: dict[int, str] = dict(
+            enumerate(
+                delete_instrumentation_comments(
+                    load_code_lines_from_file(self.file_path), self.comment_token
+                ),
+                start=1,
+            )
         )
         self.begin_copyright_lines: int = self._count_copyright_comments()
         if self.begin_copyright_lines > 0:
@@ -37,6 +43,8 @@ class TraceCollector:
             )
         self.line2blocks: dict[int, list[tuple[str, int]]] = {}
         self.block2cov: dict[tuple[str, int], int] = {}
+        # whether block2cov is shared with a frozen copy (and must be copied on write)
+        self._block2cov_shared: bool = False
         self.block2lines: dict[tuple[str, int], tuple[int, int]] = (
             {}
         )  # block -> lines (with additional instrumentation comments)
@@ -58,6 +66,22 @@ class TraceCollector:
             assert line_start == self.real_line2line[real_line_start]
             assert line_end == self.real_line2line[real_line_end]
 
+    def freeze(self) -> "TraceCollector":
+        """
+        Get a shallow copy that is not affected by later traces collected by this
+        collector, so that it can be serialized in the background. Nothing is copied
+        here: `block2cov` is copied on the next write, `summary` is always replaced
+        rather than updated, and the other attributes are never modified after
+        initialization.
+        """
+        self._block2cov_shared = True
+        return copy.copy(self)
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        # nothing shares the unpickled coverage (older versions did not save the flag)
+        self._block2cov_shared = False
+
     def _str_for_debug(self):
         _debug_str = ""
         # print all variables and their values (formatted)
@@ -98,6 +122,31 @@ class TraceCollector:
         assert len(function_real_lines) > 0
         return (func_covered_lines, len(function_real_lines))
 
+    def get_function_cov(
+        self, func_name: str, exec_block_ids: list[int]
+    ) -> tuple[tuple[int, int], tuple[int, int]]:
+        """
+        Get both the line coverage and the executed block coverage of a function,
+        i.e., `get_function_line_cov` and `get_exec_block_cov` in a single pass.
+        """
+        function_real_lines = self.get_function_real_lines(func_name)
+        exec_blocks = {(func_name, block_id) for block_id in exec_block_ids}
+
+        func_covered_lines = 0
+        exec_lines = 0
+        for real_line in function_real_lines:
+            line = self.real_line2line[real_line]
+            if self.get_line_covered_times(line) > 0:
+                func_covered_lines += 1
+            if self.line2blocks[line][-1] in exec_blocks:
+                exec_lines += 1
+
+        assert len(function_real_lines) > 0
+        return (func_covered_lines, len(function_real_lines)), (
+            exec_lines,
+            len(function_real_lines),
+        )
+
     def get_exec_block_cov(
         self, func_name: str, exec_block_ids: list[int]
     ) -> tuple[int, int]:
@@ -225,7 +274,7 @@ class TraceCollector:
         self.instrumentation_cnt = 0
         for i in range(1, self.size + 1):
             line = self.line2code[i]
-            match = re.match(TRACE_PATTERN, line.strip())
+            match = TRACE_PATTERN.match(line.strip())
             if match:
                 self.instrumentation_cnt += 1
                 action, func_name, bb_id = match.groups()
@@ -334,6 +383,9 @@ class TraceCollector:
         new_covered_line_contents: dict[int, str] = {}
         executed_blocks = get_executed_blocks(trace_str)
         if add_coverage:
+            if self._block2cov_shared:
+                self.block2cov = dict(self.block2cov)
+                self._block2cov_shared = False
             GLOBAL_BLOCK_first_covered = False
             for block in executed_blocks:
                 prev_cov = self.block2cov.get(block, 0)
@@ -423,7 +475,7 @@ class TraceCollector:
                     for line in range(start_line, end_line + 1):
                         if not self.line2code[line].strip():
                             continue
-                        if re.match(TRACE_PATTERN, self.line2code[line].strip()):
+                        if TRACE_PATTERN.match(self.line2code[line].strip()):
                             continue
                         total_real_lines += 1
                         if self.get_line_covered_times(line) > 0:
@@ -441,10 +493,12 @@ class TraceCollector:
         merged_unex_comments = self._merge_unexecuted_comments(summary_list)
         summary_list = merged_unex_comments
 
-        self.summary = {
+        # build the new summary before replacing it, as it may be shared with a frozen copy
+        summary = {
             1: f"{self.comment_token} {self.file_path} ({self.size - self.instrumentation_cnt} lines total)"
         }
-        self.summary.update({i + 2: summary_list[i] for i in range(len(summary_list))})
+        summary.update({i + 2: summary_list[i] for i in range(len(summary_list))})
+        self.summary = summary
 
         if target_lines != (None, None):
             target_lines_cov = [
@@ -589,7 +643,7 @@ def get_executed_blocks(trace_str: str) -> set[tuple[str, int]]:
     executed_blocks.add(GLOBAL_BLOCK)
 
     for line in trace_str.split("\n"):
-        match = re.match(TRACE_PATTERN, line.strip())
+        match = TRACE_PATTERN.match(line.strip())
         if match:
             action, func_name, bb_id = match.groups()
             executed_blocks.add((func_name, int(bb_id)))
@@ -615,7 +669,7 @@ def trace_compress(trace: str) -> list[tuple[str, str, list[int]]]:
     call_chain = []
 
     for line in lines:
-        matches = re.findall(FILE_TRACE_PATTERN, line.strip())
+        matches = FILE_TRACE_PATTERN.findall(line.strip())
         if len(matches) == 0:
             continue
 
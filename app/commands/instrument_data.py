@@ -3,7 +3,6 @@ Statistics collection command for ACE.
 """
 
 import os
-import re
 from collections import defaultdict
 
 from loguru import logger
@@ -55,14 +54,14 @@ def collect_instrument_code_data(directory, extensions=None):
             instr_statement_count = 0
 
             # Use regex to find cost statistics
-            total_cost_match = re.search(TOTAL_COST_PATTERN, content)
-            split_cost_match = re.search(SPLIT_COST_PATTERN, content)
-            instrumented_cost_match = re.search(INSTRUMENTED_COST_PATTERN, content)
+            total_cost_match = TOTAL_COST_PATTERN.search(content)
+            split_cost_match = SPLIT_COST_PATTERN.search(content)
+            instrumented_cost_match = INSTRUMENTED_COST_PATTERN.search(content)
 
             if total_cost_match and split_cost_match and instrumented_cost_match:
                 # Count instrumentation statements using FILE_TRACE_PATTERN
                 for line in content.split("\n"):
-                    if re.search(FILE_TRACE_PATTERN, line.strip()):
+                    if FILE_TRACE_PATTERN.search(line.strip()):
                         instr_statement_count += 1
                 if instr_statement_count % 2 != 0:
                     logger.error(
@@ -6,7 +6,6 @@ import atexit
 import concurrent.futures
 import os
 import random
-import re
 import sys
 import threading
 import time
@@ -62,16 +61,14 @@ def split_trace_by_file(trace_str: str) -> dict[str, str]:
         if not line.strip():
             continue
 
-        matches = re.findall(FILE_TRACE_PATTERN, line.strip())
+        matches = FILE_TRACE_PATTERN.findall(line.strip())
         if len(matches) == 0:
             continue
 
         for match in matches:
             file_path, action, func_name, block_id = match
             assert f"[{file_path}] {action} {func_name} {block_id}" in line
-            assert (
-                re.search(TRACE_PATTERN, f"{action} {func_name} {block_id}") is not None
-            )
+            assert TRACE_PATTERN.search(f"{action} {func_name} {block_id}") is not None
             file_traces[file_path].append(
                 f"[{file_path}] {action} {func_name} {block_id}"
             )
@@ -225,6 +225,52 @@ class MessageThread:
         """
         Path(file_path).write_text(json.dumps(self.messages, indent=4))
 
+    def checkpoint(self) -> tuple:
+        """
+        Record the current state of the thread, so that messages appended afterwards
+        can be discarded with `rollback` instead of deep-copying the whole thread.
+        Returns:
+            tuple: Opaque checkpoint to be passed to `rollback`.
+        """
+        cache_marks = [
+            (msg, msg.get("cache_control"), msg["content"][0].get("cache_control"))
+            for msg in self.messages
+        ]
+        return (
+            len(self.messages),
+            self.last_cached_round,
+            self.cache_window,
+            cache_marks,
+        )
+
+    def rollback(self, checkpoint: tuple):
+        """
+        Restore the thread to a state recorded by `checkpoint`.
+        Args:
+            checkpoint (tuple): The value returned by `checkpoint`.
+        """
+        length, self.last_cached_round, self.cache_window, cache_marks = checkpoint
+        del self.messages[length:]
+        # later cached messages may have cleared the cache control of earlier ones
+        for msg, msg_mark, content_mark in cache_marks:
+            if msg_mark is None:
+                msg.pop("cache_control", None)
+            else:
+                msg["cache_control"] = msg_mark
+            if content_mark is None:
+                msg["content"][0].pop("cache_control", None)
+            else:
+                msg["content"][0]["cache_control"] = content_mark
+
+    def mark_cache_breakpoint(self, index: int = -1):
+        """
+        Mark an existing message as a prompt-cache breakpoint, e.g., after the messages
+        following it (including the previous breakpoint) were removed.
+        Args:
+            index (int): Index of the message to mark, the last message by default.
+        """
+        self._set_cache_control(self.messages[index])
+
     def get_round_number(self) -> int:
         """
         From the current message history, decide how many rounds have been completed.
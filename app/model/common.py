@@ -1,6 +1,7 @@
 import os
 import sys
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
 from typing import Any, Literal
 
 import litellm
@@ -232,14 +233,14 @@ def init_agent_usage_details() -> dict[str, Usage]:
 
 def update_usage_details(
     usage_details: dict[str, Usage],
-    last_call: list[str],
+    last_call: Sequence[str],
     usage: Usage,
 ) -> None:
     """Update usage details for the current call.
 
     Args:
         usage_details: Dictionary containing usage details for each tool
-        last_call: List of tool names that were called in the last iteration
+        last_call: Tool names that were called in the last iteration
         usage: Usage object containing the current call's usage information
     """
     usage_details["TOTAL"] += usage
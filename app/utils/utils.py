@@ -1,4 +1,5 @@
 import difflib
+import functools
 import io
 import multiprocessing
 import os
@@ -53,7 +54,7 @@ def add_qoutes(code_str: str, language: str) -> str:
 
 
 # Reads source lines from a file, indexed by line numbers
-def load_code_from_file(file_path: str) -> dict[int, str]:
+def load_code_lines_from_file(file_path: str) -> list[str]:
     global PROJECT_DIR
     if not os.path.exists(file_path):
         if os.path.exists(os.path.join(PROJECT_DIR, file_path)):
@@ -61,12 +62,13 @@ def load_code_from_file(file_path: str) -> dict[int, str]:
         else:
             logger.error("File not found: {}", file_path)
             raise FileNotFoundError
-    lines_dict = {}
     logger.info("Loading file from {}", file_path)
     with open(file_path) as file:
-        for index, line in enumerate(file, start=1):
-            lines_dict[index] = line.rstrip("\n")
-    return lines_dict
+        return [line.rstrip("\n") for line in file]
+
+
+def load_code_from_file(file_path: str) -> dict[int, str]:
+    return dict(enumerate(load_code_lines_from_file(file_path), start=1))
 
 
 # Format indexed code as a string
@@ -418,6 +420,7 @@ def restore_deleted_blocks(original_content: str, instrumented_content: str) ->
     return "".join(result_lines)
 
 
+@functools.lru_cache(maxsize=256)
 def detect_language(file_path: str) -> str | None:
     """
     Detect the programming language of a file based on its extension.
@@ -506,6 +509,7 @@ def detect_language(file_path: str) -> str | None:
     return language
 
 
+@functools.lru_cache(maxsize=256)
 def get_comment_token(language: str | None) -> str:
     """
     Get the comment token for a specific programming language.
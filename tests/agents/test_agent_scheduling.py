@@ -0,0 +1,168 @@
+import json
+
+import pytest
+from litellm.types.utils import ChatCompletionMessageToolCall
+
+from app.agents.agent_scheduling import RENDERED_FORMAT_REMINDER, TestCaseScheduler
+from app.model import common
+from app.model.common import Usage
+
+
+class FakeModel:
+    """Model returning a scripted sequence of selections"""
+
+    def __init__(self, selections: list[int]):
+        self.selections = list(selections)
+        self.received_messages: list[list[dict]] = []
+
+    def call(self, messages, temperature=None, tools=None):
+        self.received_messages.append([dict(msg) for msg in messages])
+        test_case_id = self.selections.pop(0)
+        tool_call = ChatCompletionMessageToolCall(
+            id=f"call_{len(self.received_messages)}",
+            type="function",
+            function={
+                "name": "provide_selection",
+                "arguments": json.dumps({"test_case_id": test_case_id}),
+            },
+        )
+        return "", [tool_call], Usage(model="gpt-4o", call_cnt=1)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    def _install(selections: list[int]) -> FakeModel:
+        model = FakeModel(selections)
+        monkeypatch.setattr(common, "SELECTED_MODEL", model, raising=False)
+        return model
+
+    return _install
+
+
+def test_schedule_does_not_pollute_cached_thread(fake_model):
+    """Tool-call turns should not remain in the cached message thread"""
+    model = fake_model([5, 1])
+    scheduler = TestCaseScheduler()
+    provided_tc_info = {0: "tc 0", 1: "tc 1"}
+
+    selected, _, msg_thread = scheduler.schedule(provided_tc_info)
+    assert selected == 1
+
+    cached_len = len(scheduler.cached_msg_thread.messages)
+    assert cached_len == 2  # system + user
+    # the returned thread keeps the whole conversation for debugging
+    assert len(msg_thread.messages) > cached_len
+    assert len(model.received_messages) == 2
+
+
+def test_schedule_reuses_cache_for_new_test_cases(fake_model):
+    """New test cases should be appended to the cached message thread"""
+    fake_model([1, 2])
+    scheduler = TestCaseScheduler()
+
+    assert scheduler.schedule({0: "tc 0", 1: "tc 1"})[0] == 1
+    assert scheduler.schedule({0: "tc 0", 1: "tc 1", 2: "tc 2"})[0] == 2
+
+    messages = scheduler.cached_msg_thread.messages
+    assert [msg["role"] for msg in messages] == ["system", "user", "user"]
+    assert "tc 2" in messages[-1]["content"][0]["text"]
+
+
+def test_schedule_marks_cache_breakpoints(fake_model):
+    """System prompt and the latest test case block should be cache breakpoints"""
+    fake_model([1, 2])
+    scheduler = TestCaseScheduler()
+    scheduler.schedule({0: "tc 0", 1: "tc 1"})
+    scheduler.schedule({0: "tc 0", 1: "tc 1", 2: "tc 2"})
+
+    system_msg, first_user_msg, last_user_msg = scheduler.cached_msg_thread.messages
+    assert "cache_control" in system_msg["content"][0]
+    assert "cache_control" not in first_user_msg["content"][0]
+    assert "cache_control" in last_user_msg["content"][0]
+
+
+def test_schedule_keeps_longest_cached_prefix(fake_model):
+    """Dropping a test case should only rebuild the batches after it"""
+    fake_model([1, 2, 3])
+    scheduler = TestCaseScheduler()
+    scheduler.schedule({1: "tc 1", 0: "tc 0"})
+    scheduler.schedule({0: "tc 0", 1: "tc 1", 2: "tc 2"})
+    first_user_msg = scheduler.cached_msg_thread.messages[1]
+
+    # test case 2 is no longer provided
+    assert scheduler.schedule({0: "tc 0", 1: "tc 1", 3: "tc 3"})[0] == 3
+
+    messages = scheduler.cached_msg_thread.messages
+    assert messages[1] is first_user_msg
+    first_text = first_user_msg["content"][0]["text"]
+    assert first_text.index("tc 0") < first_text.index("tc 1")
+    assert len(messages) == 3
+    assert "tc 3" in messages[2]["content"][0]["text"]
+    assert "tc 2" not in messages[2]["content"][0]["text"]
+    assert scheduler.cached_tc_ids == [0, 1, 3]
+
+
+def test_schedule_keeps_breakpoint_after_truncation(fake_model):
+    """Dropping the latest batch should move the breakpoint to the kept prefix"""
+    model = fake_model([1, 2, 0])
+    scheduler = TestCaseScheduler()
+    scheduler.schedule({0: "tc 0", 1: "tc 1"})
+    scheduler.schedule({0: "tc 0", 1: "tc 1", 2: "tc 2"})
+
+    # test case 2 is no longer provided, and no new test case is added
+    assert scheduler.schedule({0: "tc 0", 1: "tc 1 (selected)"})[0] == 0
+
+    system_msg, kept_user_msg = scheduler.cached_msg_thread.messages
+    assert "cache_control" in system_msg["content"][0]
+    assert "cache_control" in kept_user_msg["content"][0]
+    assert "cache_control" in model.received_messages[-1][1]["content"][0]
+
+
+def test_schedule_rebuilds_on_cache_miss(fake_model):
+    """Without a common prefix only the system prompt should be kept"""
+    fake_model([1, 2])
+    scheduler = TestCaseScheduler()
+    system_msg = scheduler.cached_msg_thread.messages[0]
+    scheduler.schedule({0: "tc 0", 1: "tc 1"})
+
+    # test case 0 is no longer provided
+    assert scheduler.schedule({1: "tc 1", 2: "tc 2"})[0] == 2
+
+    messages = scheduler.cached_msg_thread.messages
+    assert len(messages) == 2
+    assert messages[0] is system_msg
+    assert "cache_control" in system_msg["content"][0]
+    assert "tc 0" not in messages[1]["content"][0]["text"]
+    assert scheduler.cached_tc_ids == [1, 2]
+
+
+def test_schedule_single_test_case(fake_model):
+    """A single test case should be selected without calling the model"""
+    model = fake_model([])
+    scheduler = TestCaseScheduler()
+
+    selected, usage_details, _ = scheduler.schedule({3: "tc 3"})
+    assert selected == 3
+    assert usage_details["TOTAL"].call_cnt == 0
+    assert len(model.received_messages) == 0
+
+
+def test_schedule_usage_details(fake_model):
+    """Usage should be attributed to the tools called in each turn"""
+    fake_model([5, 1])
+    scheduler = TestCaseScheduler()
+
+    _, usage_details, _ = scheduler.schedule({0: "tc 0", 1: "tc 1"})
+    assert usage_details["TOTAL"].call_cnt == 2
+    assert usage_details["provide_selection"].call_cnt == 2
+    assert "INITIAL" in usage_details
+
+
+def test_schedule_user_prompt_layout(fake_model):
+    """The format reminder and test cases are separated by blank lines"""
+    fake_model([1])
+    scheduler = TestCaseScheduler()
+    scheduler.schedule({1: "tc 1", 0: "tc 0"})
+
+    text = scheduler.cached_msg_thread.messages[1]["content"][0]["text"]
+    assert text == RENDERED_FORMAT_REMINDER + "\n\ntc 0\n\ntc 1"
@@ -1,6 +1,13 @@
+import time
+
 import pytest
 
-from app.agents.tools.python_executor import process_python_executor
+from app.agents.tools import python_executor
+from app.agents.tools.python_executor import (
+    MAX_OUTPUT_CHARS,
+    _safe_decode_with_truncation,
+    process_python_executor,
+)
 
 
 def test_process_python_executor_success():
@@ -88,3 +95,89 @@ for i in range(3):
     assert success
     expected_output = "Line 0\nLine 1\nLine 2"
     assert output.split("--- stdout captured ---\n")[1].strip() == expected_output
+
+
+def test_safe_decode_with_truncation():
+    """Only invalid UTF-8 output comes with a hex dump, and both are truncated"""
+    assert _safe_decode_with_truncation(b"") == ("", None)
+    assert _safe_decode_with_truncation("héllo".encode()) == ("héllo", None)
+    assert _safe_decode_with_truncation(b"a\xffb") == ("a�b", "61ff62")
+    assert _safe_decode_with_truncation(b"a" * MAX_OUTPUT_CHARS) == (
+        "a" * MAX_OUTPUT_CHARS,
+        None,
+    )
+    assert _safe_decode_with_truncation(b"a" * MAX_OUTPUT_CHARS + b"\xff") == (
+        "a" * MAX_OUTPUT_CHARS
+        + f"\n[... output truncated after {MAX_OUTPUT_CHARS} characters ...]",
+        None,
+    )
+
+    decoded, hex_dump = _safe_decode_with_truncation(
+        "é".encode() * MAX_OUTPUT_CHARS * 3
+    )
+    assert decoded == "é" * MAX_OUTPUT_CHARS + (
+        f"\n[... output truncated after {MAX_OUTPUT_CHARS} characters ...]"
+    )
+    assert hex_dump is None
+
+    decoded, hex_dump = _safe_decode_with_truncation(b"\xff" * (MAX_OUTPUT_CHARS + 1))
+    assert decoded.startswith("�" * MAX_OUTPUT_CHARS + "\n[... output truncated")
+    assert hex_dump == "ff" * MAX_OUTPUT_CHARS + (
+        f"\n[... hex output truncated after {MAX_OUTPUT_CHARS * 2} characters ...]"
+    )
+
+
+def test_process_python_executor_large_output():
+    """Huge outputs are truncated without being buffered in full"""
+    code = """
+import sys
+sys.stdout.write("x" * 10_000_000)
+"""
+    output, success = process_python_executor(code)
+    assert success
+    assert f"[... output truncated after {MAX_OUTPUT_CHARS} characters ...]" in output
+    assert "x" * MAX_OUTPUT_CHARS + "\n[" in output
+
+
+def test_process_python_executor_long_code():
+    """Code longer than a single command line argument can be executed"""
+    code = "x = 0\n" + "x += 1\n" * 20000 + "print(x)\n"
+    output, success = process_python_executor(code)
+    assert success
+    assert output.split("--- stdout captured ---\n")[1].strip() == "20000"
+
+
+def test_process_python_executor_runs_a_file():
+    """The code runs from a file, with `__file__` and source lines in tracebacks"""
+    code = """
+import os
+print(os.path.isfile(__file__))
+def f():
+    raise ValueError("boom")
+f()
+"""
+    output, success = process_python_executor(code)
+    assert not success
+    assert "True" in output
+    assert 'raise ValueError("boom")' in output
+
+
+@pytest.mark.parametrize("main_process_sleeps", [False, True])
+def test_process_python_executor_background_process(monkeypatch, main_process_sleeps):
+    """Background processes holding the output pipes do not delay the result"""
+    monkeypatch.setattr(python_executor, "EXECUTION_TIMEOUT", 2)
+    code = f"""
+import subprocess
+import time
+subprocess.Popen(["sleep", "8"])
+print("started", flush=True)
+if {main_process_sleeps}:
+    time.sleep(8)
+"""
+    start = time.monotonic()
+    output, success = process_python_executor(code)
+    assert time.monotonic() - start < 5
+    assert "started" in output
+    assert success != main_process_sleeps
+    if main_process_sleeps:
+        assert "timeout (2 seconds)" in output
@@ -1,3 +1,4 @@
+from app.agents.tools import smt_solver
 from app.agents.tools.smt_solver import process_smt_solver
 
 
@@ -405,3 +406,216 @@ def test_format1_complex_nested_constraints():
     assert success
     x_val = int(result.split("=")[1].strip())
     assert 5 <= x_val < 10
+
+
+def test_solve_cache_reuses_identical_constraints(monkeypatch):
+    """Identical constraints are only solved once, variables of other sorts are not confused"""
+    monkeypatch.setattr(smt_solver, "_solve_cache", smt_solver.OrderedDict())
+    solve_calls = []
+    solve_constraint = smt_solver._solve_constraint
+
+    def counting_solve_constraint(constraint):
+        solve_calls.append(constraint)
+        return solve_constraint(constraint)
+
+    monkeypatch.setattr(smt_solver, "_solve_constraint", counting_solve_constraint)
+
+    first = process_smt_solver("z3.Int('x') * 2 == 3")
+    assert first == ("Constraints unsatisfiable.", False)
+    assert process_smt_solver("  z3.Int('x') * 2 == 3\n") == first
+    assert len(solve_calls) == 1
+
+    assert process_smt_solver("z3.Real('x') * 2 == 3") == ("x = 3/2", True)
+    assert len(solve_calls) == 2
+
+
+def test_unsat_core_subsumes_constraints(monkeypatch):
+    """Constraints containing a known unsat core are unsatisfiable without solving"""
+    monkeypatch.setattr(smt_solver, "_unsat_cores", smt_solver.deque())
+    assert process_smt_solver(
+        "z3.And(z3.Int('x') > 2, z3.Int('y') > 0, z3.Int('x') < 1)"
+    ) == ("Constraints unsatisfiable.", False)
+    assert len(smt_solver._unsat_cores) == 1
+    assert len(smt_solver._unsat_cores[0]) == 2
+
+    # solving it would have recorded another core
+    assert process_smt_solver(
+        "z3.And(z3.Int('x') < 1, z3.Int('z') == 5, z3.Int('x') > 2)"
+    ) == ("Constraints unsatisfiable.", False)
+    assert len(smt_solver._unsat_cores) == 1
+
+
+def test_format2_with_imports_and_nested_blocks():
+    """Test Format 2 with import statements, nested blocks and names starting with import/from"""
+    constraint = """```python
+import z3
+from_value = z3.Int('from_value')
+imported = []
+for i in range(3):
+    import os
+    imported.append(z3.Int(f'v{i}') == from_value + i)
+final_constraint = z3.And(*imported, from_value == 2)
+```"""
+    result, success = process_smt_solver(constraint)
+
+    assert success
+    assert result == "from_value = 2\nv0 = 2\nv1 = 3\nv2 = 4"
+
+
+def test_format2_indented_code_block():
+    """Test Format 2 whose indentation is only lost on the first line"""
+    constraint = """
+    x = z3.Int('x')
+    y = x
+    for i in range(2):
+        # shift the variable
+        y = y + 1
+
+    final_constraint = y == 5
+    """
+    assert process_smt_solver(constraint) == ("x = 3", True)
+
+
+def test_solver_reuse_does_not_leak_constraints():
+    """Constraints of previous checks are not kept in the reused solver"""
+    assert process_smt_solver("z3.Int('leak') > 100") == ("leak = 101", True)
+    assert process_smt_solver("z3.Int('other') == 1") == ("other = 1", True)
+    assert process_smt_solver("z3.Int('leak') == 1") == ("leak = 1", True)
+    assert len(smt_solver._get_solver().assertions()) == 0
+
+
+def test_constraint_cache_skips_rebuilding(monkeypatch):
+    """The same constraints are only evaluated once, invalid code blocks are not cached"""
+    monkeypatch.setattr(smt_solver, "_constraint_cache", smt_solver.OrderedDict())
+    build_calls = []
+    build_constraint = smt_solver._build_constraint
+
+    def counting_build_constraint(smt_constraints):
+        build_calls.append(smt_constraints)
+        return build_constraint(smt_constraints)
+
+    monkeypatch.setattr(smt_solver, "_build_constraint", counting_build_constraint)
+
+    code_block = "```\nx = z3.Int('cached')\nfinal_constraint = x == 4\n```"
+    assert process_smt_solver(code_block) == ("cached = 4", True)
+    assert process_smt_solver(code_block.replace("```\n", "```python\n")) == (
+        "cached = 4",
+        True,
+    )
+    assert len(build_calls) == 1
+
+    for _ in range(2):
+        _, success = process_smt_solver("x = z3.Int('cached')")
+        assert not success
+    assert len(build_calls) == 3
+
+
+def test_model_value_formatting():
+    """Model values of each sort are formatted as before"""
+    constraint = """z3.And(
+        z3.Int('i') == -3,
+        z3.Real('q') * 2 == 3,
+        z3.Real('r') * z3.Real('r') == 2,
+        z3.Real('r') > 0,
+        z3.Not(z3.Bool('b')),
+        z3.BitVec('bv', 8) == 5
+    )"""
+    result, success = process_smt_solver(constraint)
+
+    assert success
+    values = dict(line.split(" = ") for line in result.split("\n"))
+    assert values.pop("r").startswith("1.41421356")
+    assert values == {"b": "False", "bv": "5", "i": "-3", "q": "3/2"}
+
+
+def test_code_block_markers():
+    """Code block markers are removed with the language hint and any trailing text"""
+    assert process_smt_solver(
+        "```python\nfinal_constraint = z3.Int('m') == 1\n```\nThis is the constraint."
+    ) == ("m = 1", True)
+    assert process_smt_solver("```\nz3.Int('m') == 2") == ("m = 2", True)
+
+
+# FORMAT 3: SMT-LIB2 script tests
+def test_format3_smtlib2_script():
+    """Test Format 3 with an SMT-LIB2 script"""
+    constraint = """```smt2
+(set-logic QF_LIA)
+(declare-const x Int)
+(declare-fun y () Int)
+(assert (> x 0))
+(assert (< y 10))
+(assert (= (+ x y) 7))
+(check-sat)
+```"""
+    result, success = process_smt_solver(constraint)
+
+    assert success
+    values = {}
+    for line in result.split("\n"):
+        var, val = line.split("=")
+        values[var.strip()] = int(val.strip())
+
+    assert values["x"] > 0
+    assert values["y"] < 10
+    assert values["x"] + values["y"] == 7
+
+
+def test_format3_undeclared_variable():
+    """Test Format 3 with a variable that is not declared"""
+    result, success = process_smt_solver("(assert (> undeclared 0))")
+
+    assert not success
+    assert result.startswith("Error parsing SMT-LIB2 constraints:")
+    assert "unknown constant undeclared" in result
+
+
+def test_parallel_solving(monkeypatch):
+    """Large conjunctions can be solved by the parallel tactic"""
+    monkeypatch.setattr(smt_solver, "PARALLEL_SOLVING", True)
+    constraint = (
+        "z3.And("
+        + ", ".join(f"z3.Int('p{i}') == {i}" for i in range(8))
+        + ", z3.Int('p0') < 1)"
+    )
+    result, success = process_smt_solver(constraint)
+
+    assert success
+    assert result == "\n".join(f"p{i} = {i}" for i in range(8))
+
+
+def test_solve_cache_ignores_variable_names(monkeypatch):
+    """Constraints that only differ in variable names share cached results"""
+    monkeypatch.setattr(smt_solver, "_solve_cache", smt_solver.OrderedDict())
+    solve_calls = []
+    solve_constraint = smt_solver._solve_constraint
+
+    def counting_solve_constraint(constraint):
+        solve_calls.append(constraint)
+        return solve_constraint(constraint)
+
+    monkeypatch.setattr(smt_solver, "_solve_constraint", counting_solve_constraint)
+
+    first = "z3.And(z3.Int('a') == 3, z3.Int('b') == z3.Int('a') + 1)"
+    assert process_smt_solver(first) == ("a = 3\nb = 4", True)
+    renamed = "z3.And(z3.Int('y') == 3, z3.Int('x') == z3.Int('y') + 1)"
+    assert process_smt_solver(renamed) == ("x = 4\ny = 3", True)
+    assert len(solve_calls) == 1
+
+
+def test_persistent_solve_cache(monkeypatch, tmp_path):
+    """Cached results can be kept across runs in a shelve file"""
+    monkeypatch.setattr(
+        smt_solver, "PERSISTENT_SOLVE_CACHE_FILE", str(tmp_path / "smtcache")
+    )
+    monkeypatch.setattr(smt_solver, "_solve_cache", smt_solver.OrderedDict())
+    monkeypatch.setattr(smt_solver, "_persistent_solve_cache", None)
+    assert process_smt_solver("z3.Int('persisted') == 7") == ("persisted = 7", True)
+    smt_solver._persistent_solve_cache.close()
+
+    # a new run only has the persistent cache
+    monkeypatch.setattr(smt_solver, "_solve_cache", smt_solver.OrderedDict())
+    monkeypatch.setattr(smt_solver, "_persistent_solve_cache", None)
+    monkeypatch.setattr(smt_solver, "_solve_constraint", None)
+    assert process_smt_solver("z3.Int('renamed') == 7") == ("renamed = 7", True)
+    smt_solver._persistent_solve_cache.close()
@@ -0,0 +1,78 @@
+import os
+
+from app.agents.tools import code_request
+from app.agents.tools.code_request import process_code_request
+from app.agents.trace import TraceCollector
+
+
+def test_process_code_request_reloads_modified_files(tmp_path, monkeypatch):
+    """Requested files are only loaded again after they are modified"""
+    file_path = tmp_path / "a.c"
+    file_path.write_text("int main() {\n  return 0;\n}\n")
+    loaded = []
+    load_code_lines_from_file = code_request.load_code_lines_from_file
+    monkeypatch.setattr(
+        code_request,
+        "load_code_lines_from_file",
+        lambda path: loaded.append(path) or load_code_lines_from_file(path),
+    )
+    request = [{"filepath": str(file_path), "lines": "1-2"}]
+
+    result = process_code_request(request, 1)
+    assert "return 0;" in result
+    assert "return 0;" in process_code_request(request, 1)
+    assert len(loaded) == 1
+
+    file_path.write_text("int main() {\n  return 1;\n}\n")
+    os.utime(file_path, ns=(0, 0))
+    assert "return 1;" in process_code_request(request, 1)
+    assert len(loaded) == 2
+
+
+def test_process_code_request_invalid_paths(tmp_path):
+    """Missing files and directories are reported as errors"""
+    result = process_code_request(
+        [{"filepath": str(tmp_path / "missing.c")}, {"filepath": str(tmp_path)}], 0
+    )
+    assert "missing.c' not found" in result
+    assert "is a directory" in result
+
+
+def test_process_code_request_line_ranges(tmp_path):
+    """Line ranges are parsed leniently and clipped to the file"""
+    file_path = tmp_path / "a.c"
+    file_path.write_text("int main() {\n  return 0;\n}\n")
+
+    def request(lines):
+        return process_code_request([{"filepath": str(file_path), "lines": lines}], 1)
+
+    assert "[LINES: 2-3]" in request("3 - 2")
+    assert "[LINES: 2-2]" in request("2")
+    assert "[LINES: 1-3]" in request("1-10")
+    assert "clip the end to the last line" in request("1-10")
+    assert "DO NOT return any code" in request("5-10")
+    assert "Invalid line range format" in request("a-b")
+    assert "Invalid line range format" in request("1-2-3")
+
+
+def test_process_code_request_coverage_built_once_per_file(tmp_path, monkeypatch):
+    """The line coverage of a file is built once for all of its requested ranges"""
+    file_path = tmp_path / "a.c"
+    file_path.write_text("int main() {\n  return 0;\n}\n")
+    built = []
+    get_real_line_coverage = TraceCollector.get_real_line_coverage
+    monkeypatch.setattr(
+        TraceCollector,
+        "get_real_line_coverage",
+        lambda self: built.append(self.file_path) or get_real_line_coverage(self),
+    )
+
+    result = process_code_request(
+        [
+            {"filepath": str(file_path), "lines": "1-1"},
+            {"filepath": str(file_path), "lines": "3-3"},
+        ],
+        1,
+    )
+    assert result.index("[LINES: 1-1]") < result.index("[LINES: 3-3]")
+    assert len(built) == 1
@@ -1,3 +1,7 @@
+from app.agents.common import (
+    delete_instrumentation_comments,
+    delete_instrumentation_from_code,
+)
 from app.agents.trace import trace_compress
 
 
@@ -130,3 +134,43 @@ def test_trace_compress():
 
     cycle_result = trace_compress(cycle_trace)
     assert cycle_result == expected_cycle
+
+
+def test_delete_instrumentation_from_code():
+    """Test removing instrumentation statements and trailing cost comments"""
+    instrumented_lines = [
+        "int main() {",
+        '    fprintf(stderr, "enter main 1\\n");',
+        "    return 0;",
+        '    fprintf(stderr, "exit main 1\\n");',
+        "}",
+        "",
+        "// Total cost: 0.123456",
+        "// Total instrumented cost: 0.1, input tokens: 1, output tokens: 2",
+        "   ",
+    ]
+
+    assert delete_instrumentation_comments(instrumented_lines, "//") == [
+        "int main() {",
+        '    fprintf(stderr, "enter main 1\\n");',
+        "    return 0;",
+        '    fprintf(stderr, "exit main 1\\n");',
+        "}",
+        "",
+    ]
+    assert delete_instrumentation_from_code(instrumented_lines, "//") == [
+        "int main() {",
+        "    return 0;",
+        "}",
+        "",
+    ]
+
+    # comments that are not cost comments are kept
+    assert delete_instrumentation_from_code(["// Total", ""], "//") == ["// Total"]
+    assert delete_instrumentation_from_code([], "//") == []
+    # code without any logging statement is kept as is
+    assert delete_instrumentation_from_code(["int x;", "", "// end"], "//") == [
+        "int x;",
+        "",
+        "// end",
+    ]
@@ -112,13 +112,28 @@ class TestCoverage:
         success = coverage_instance.save_to_file(save_path, async_save=True)
         assert success, "Failed to start async save"
 
-        # Wait for save process to complete
-        if Coverage._save_process is not None:
-            Coverage._save_process.join()
+        # Wait for save thread to complete
+        if Coverage._save_thread is not None:
+            Coverage._save_thread.join()
 
-        # Verify file exists after save process completes
+        # Verify file exists after save thread completes
         assert os.path.exists(save_path), "Save file was not created after async save"
 
+    def test_frozen_snapshot(self, coverage_instance, sample_file_path):
+        """Test that a frozen collector is not affected by later traces."""
+        tc = coverage_instance.get_file_coverage(sample_file_path)
+        frozen = tc.freeze()
+        frozen_block2cov = dict(frozen.block2cov)
+        frozen_summary = frozen.summary
+
+        coverage_instance.collect_trace(
+            sample_file_path, "enter test_function 1\nexit test_function 1\n"
+        )
+
+        assert frozen.block2cov == frozen_block2cov
+        assert frozen.summary is frozen_summary
+        assert tc.block2cov[("test_function", 1)] == 2
+
     def test_error_handling(self, temp_dir):
         """Test error handling during save and load."""
         # Initialize coverage
@@ -134,9 +149,9 @@ class TestCoverage:
         success = coverage.save_to_file(invalid_path, async_save=True)
         assert success, "Async save should return success immediately"
 
-        # Wait for save process to complete
-        if Coverage._save_process is not None:
-            Coverage._save_process.join()
+        # Wait for save thread to complete
+        if Coverage._save_thread is not None:
+            Coverage._save_thread.join()
 
         # Verify file doesn't exist after failed async save
         assert not os.path.exists(
@@ -0,0 +1,49 @@
+from app.agents.tools.detect_functions import (
+    _index_source_code,
+    process_report_functions,
+)
+
+SOURCE_CODE = """#include <stdio.h>
+
+static void CALLBACK verbose_stats_dump(PVOID param _U_,
+                                       BOOLEAN timer_fired _U_)
+{
+}
+
+DIAG_OFF_DEPRECATION
+static void
+print_version(FILE *f)
+{
+}
+"""
+
+
+def test_process_report_functions():
+    """Signatures are matched on their first line, even if they span several lines"""
+    observation, lines = process_report_functions(
+        [
+            "static void CALLBACK verbose_stats_dump(PVOID param _U_, BOOLEAN timer_fired _U_)",
+            "print_version(FILE  *f)",
+            "DIAG_OFF_DEPRECATION static void print_version(FILE *f)",
+        ],
+        SOURCE_CODE,
+    )
+    assert observation.startswith("Successfully identified 3 function signatures")
+    assert lines == [2, 9, 7]
+
+
+def test_process_report_functions_not_found():
+    """Signatures that are not in the source code are reported"""
+    observation, lines = process_report_functions(
+        ["static void print_packets(void)", "print_version(FILE *f)"], SOURCE_CODE
+    )
+    assert '1. "static void print_packets(void)"' in observation
+    assert lines == [9]
+
+
+def test_process_report_functions_reuses_index():
+    """The source code is only indexed once for several reports"""
+    _index_source_code.cache_clear()
+    process_report_functions(["print_version(FILE *f)"], SOURCE_CODE)
+    process_report_functions(["static void print_version(FILE *f)"], SOURCE_CODE)
+    assert _index_source_code.cache_info().misses == 1
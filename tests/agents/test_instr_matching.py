@@ -39,6 +39,11 @@ def test_filter_instr_print():
         == "[aaa][oggenc/encode.c] enter update_statistics_notime_1 [bbb]\n[ccc] enter update_statistics_notime\n"
     )
 
+    # whitespace around a removed trace is kept
+    assert filter_instr_print("foo [a.c] enter f 1") == "foo \n"
+    assert filter_instr_print("[a.c] enter f 1 bar") == " bar\n"
+    assert filter_instr_print("  foo [a.c] enter f 1  \n \t ") == "foo \n"
+
 
 def test_trace_matching():
     trace_str = "xxx[oggenc/encode.c] exit update_statistics_notime 1[oggenc/encode.c] exit update_statistics_notime 1"
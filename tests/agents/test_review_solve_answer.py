@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+from app.agents.tools import review_solve_answer
+from app.agents.tools.review_solve_answer import process_review_solve_answer
+
+EXECUTION = """
+def execute_program(timeout: int) -> tuple[str, int]:
+    return "", 0
+"""
+
+
+def test_review_answer_validates_execution_once(monkeypatch):
+    """An execution that already ran successfully is accepted without running it again"""
+    monkeypatch.setattr(review_solve_answer, "_validated_executions", OrderedDict())
+    runs = []
+
+    def fake_run_target(execution_code, timeout):
+        runs.append(execution_code)
+        if "fail" in execution_code:
+            return {"exec_success": False, "exec_error": "failed"}
+        return {"exec_success": True, "exec_error": None}
+
+    monkeypatch.setattr(review_solve_answer, "run_target", fake_run_target)
+
+    accepted = ("New solution accepted.", True, EXECUTION)
+    assert process_review_solve_answer(True, EXECUTION) == accepted
+    assert process_review_solve_answer(True, EXECUTION) == accepted
+    assert len(runs) == 1
+
+    failing = EXECUTION + "# fail\n"
+    for _ in range(2):
+        message, need_adjust, execution = process_review_solve_answer(True, failing)
+        assert message.startswith("Running the given new solution failed")
+        assert execution is None
+    assert len(runs) == 3
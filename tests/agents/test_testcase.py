@@ -1,8 +1,23 @@
 import os
 import tempfile
-
-from app.agents.testcase import TestCase, TestCaseYAML, create_yaml_instance
+import threading
+
+import yaml as pyyaml
+
+from app.agents import testcase as testcase_module
+from app.agents.coverage import Coverage
+from app.agents.testcase import (
+    _C_DUMPER,
+    TestCase,
+    TestCaseManager,
+    TestCaseYAML,
+    _ceil_percentage,
+    _select_lowest_coverage_indices,
+    create_yaml_instance,
+    get_yaml_instance,
+)
 from app.commands.run import TestcaseState
+from app.model.common import Usage
 
 
 def test_target_file_lines_conversion():
@@ -547,3 +562,419 @@ def test_yaml_serialization_edge_cases():
 
         # Clean up
         os.unlink(yaml_path)
+
+
+def test_save_to_disk_multiline_block_style():
+    """Multi-line fields and usage should be saved in block style and restored"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.makedirs(os.path.join(temp_dir, "queue"), exist_ok=True)
+        test_case = TestCase(
+            id=7,
+            src_id=3,
+            target_path_constraint="x > 0\ny < 'héllo'\n",
+            states=[TestcaseState.SUMMARIZE],
+        )
+        test_case._out_dir = temp_dir
+        test_case.save_to_disk()
+
+        yaml_file = os.path.join(temp_dir, "queue", "id:000007,src:000003.yaml")
+        with open(yaml_file) as f:
+            content = f.read()
+        assert "target_path_constraint: |" in content
+        assert "usage:\n  TOTAL: {}\n" in content
+
+        loaded = TestCase.load_from_file(yaml_file, temp_dir)
+        assert loaded.target_path_constraint == test_case.target_path_constraint
+        assert loaded.usage.keys() == test_case.usage.keys()
+        assert loaded.states == test_case.states
+
+
+def test_yaml_instance_is_cached_per_thread():
+    """The YAML instance should be built once per thread"""
+    assert get_yaml_instance() is get_yaml_instance()
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_yaml_instance()))
+    thread.start()
+    thread.join()
+    assert other[0] is not get_yaml_instance()
+
+
+def test_time_taken_updated_until_finished(monkeypatch):
+    """time_taken should follow state changes and stop once finished"""
+    from app.agents import testcase as testcase_module
+
+    now = [10]
+    monkeypatch.setattr(testcase_module, "get_time_taken", lambda: now[0])
+
+    test_case = TestCase(id=1, states=[TestcaseState.SUMMARIZE])
+    test_case.exec_code = "print('no update on plain assignment')"
+    assert test_case.time_taken is None
+
+    test_case.add_state(TestcaseState.SOLVE)
+    assert test_case.time_taken == 10
+
+    now[0] = 20
+    test_case.add_state(TestcaseState.FINISHED)
+    assert test_case.time_taken == 20
+
+    now[0] = 30
+    test_case.add_usage({"TOTAL": Usage()}, state=TestcaseState.EXECUTE)
+    assert test_case.time_taken == 20
+
+
+def test_crash_testcase_hardlinked():
+    """Crashing test cases should be linked into crashes_or_hangs"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.makedirs(os.path.join(temp_dir, "queue"), exist_ok=True)
+        test_case = TestCase(id=2, src_id=1, is_crash=True, crash_info="SIGSEGV")
+        test_case._out_dir = temp_dir
+        test_case.save_to_disk()
+        # saving again should replace the existing entry
+        test_case.crash_info = "SIGABRT"
+        test_case.save_to_disk()
+
+        filename = "id:000002,src:000001.yaml"
+        crash_file = os.path.join(temp_dir, "crashes_or_hangs", filename)
+        assert os.path.samefile(os.path.join(temp_dir, "queue", filename), crash_file)
+        assert TestCase.load_from_file(crash_file, temp_dir).crash_info == "SIGABRT"
+        assert os.listdir(os.path.join(temp_dir, "crashes_or_hangs")) == [filename]
+
+
+def test_save_to_disk_skips_unchanged(monkeypatch):
+    """Saving an unchanged test case should not write the file again"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.makedirs(os.path.join(temp_dir, "queue"), exist_ok=True)
+        test_case = TestCase(id=3, exec_code="print('x')")
+        test_case._out_dir = temp_dir
+
+        written = []
+        write_to_yaml_file = TestCase.write_to_yaml_file
+        monkeypatch.setattr(
+            TestCase,
+            "write_to_yaml_file",
+            lambda self, path, *args, **kwargs: written.append(os.path.basename(path))
+            or write_to_yaml_file(self, path, *args, **kwargs),
+        )
+
+        test_case.save_to_disk()
+        test_case.save_to_disk()
+        assert written == ["id:000003.exec_code.txt", "id:000003.yaml"]
+
+        # unchanged sidecar files are not written again
+        test_case.selected_cnt += 1
+        test_case.save_to_disk()
+        assert written[2:] == ["id:000003.yaml"]
+
+        test_case.exec_code = "print('y')"
+        test_case.save_to_disk()
+        assert written[3:] == ["id:000003.exec_code.txt", "id:000003.yaml"]
+
+
+def test_sidecar_files():
+    """Large fields should be saved in sidecar files and restored on load"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        queue_dir = os.path.join(temp_dir, "queue")
+        os.makedirs(queue_dir, exist_ok=True)
+        test_case = TestCase(
+            id=4,
+            src_id=1,
+            exec_code="print('a')\n",
+            execution_trace="[a.c] enter main 1\n",
+            is_crash=True,
+        )
+        test_case._out_dir = temp_dir
+        test_case.save_to_disk()
+
+        with open(os.path.join(queue_dir, "id:000004,src:000001.yaml")) as f:
+            content = f.read()
+        assert "print('a')" not in content
+        assert "exec_code: id:000004.exec_code.txt" in content
+        with open(os.path.join(queue_dir, "id:000004.exec_code.txt")) as f:
+            assert f.read() == "print('a')\n"
+
+        # crashes_or_hangs keeps the sidecar files as well
+        crash_file = os.path.join(
+            temp_dir, "crashes_or_hangs", "id:000004,src:000001.yaml"
+        )
+        loaded = TestCase.load_from_file(crash_file, temp_dir)
+        assert loaded.exec_code == test_case.exec_code
+        assert loaded.execution_trace == test_case.execution_trace
+        assert loaded.execution_summary is None
+
+
+def test_get_already_selected_branch_but_not_reached():
+    """Only finished, unvaluable children of the source test case are reported"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        manager.add_initial_testcase("print('seed')", "trace", "summary", 1)
+
+        def create(src_id, branch):
+            return manager.create_new_testcase(
+                src_id, "summary", branch, "why", ("a.c", (1, 2)), None, "x > 0"
+            )
+
+        not_reached = create(0, "branch a")
+        not_reached.add_state(TestcaseState.FINISHED)
+        reached = create(0, "branch b")
+        reached.is_target_covered = True
+        reached.add_state(TestcaseState.FINISHED)
+        create(0, "branch c")  # not finished yet
+        grandchild = create(reached.id, "branch d")
+        grandchild.add_state(TestcaseState.FINISHED)
+        manager.save_all_testcases()
+
+        assert manager.get_already_selected_branch_but_not_reached(0) == ["branch a"]
+        assert manager.get_already_selected_branch_but_not_reached(reached.id) == [
+            "branch d"
+        ]
+        assert manager.get_already_selected_branch_but_not_reached(not_reached.id) == []
+
+        # the index is rebuilt when loading test cases from disk
+        loaded = TestCaseManager(temp_dir)
+        loaded.load_testcases(temp_dir)
+        assert loaded.get_already_selected_branch_but_not_reached(0) == ["branch a"]
+
+
+def test_load_testcases_from_dir():
+    """Valid test case files are loaded in ID order, invalid ones are skipped"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        for _ in range(3):
+            manager.add_initial_testcase("print('seed')", "trace", "summary", 1)
+        queue_dir = os.path.join(temp_dir, "queue")
+        with open(os.path.join(queue_dir, "id:000007.yaml"), "w") as f:
+            f.write("- not a test case\n")
+        with open(os.path.join(queue_dir, "README.txt"), "w") as f:
+            f.write("not a test case\n")
+
+        loaded = TestCaseManager(temp_dir)
+        loaded.load_testcases(temp_dir)
+        assert list(loaded.test_cases) == [0, 1, 2]
+        assert loaded.next_testcase_id == 3
+        assert loaded.get_testcase(2).exec_code == "print('seed')"
+
+
+def test_to_dict_reuses_formatted_usage(monkeypatch):
+    """The usage should only be formatted again after it is changed"""
+    formatted = []
+    format_usage = TestCaseYAML.format_usage
+    monkeypatch.setattr(
+        TestCaseYAML,
+        "format_usage",
+        lambda usage: formatted.append(usage) or format_usage(usage),
+    )
+
+    test_case = TestCase(id=1, states=[TestcaseState.SUMMARIZE])
+    first = test_case.to_dict()["usage"]
+    assert test_case.to_dict()["usage"] is first
+    assert len(formatted) == 1
+
+    test_case.add_usage({"TOTAL": Usage(model="gpt-4o", call_cnt=1)})
+    assert "SUMMARIZE" in test_case.to_dict()["usage"]
+    assert len(formatted) == 2
+
+
+def test_load_from_file_strips_control_characters():
+    """NULL, EOT and DEL characters should be removed before parsing"""
+    with tempfile.NamedTemporaryFile(mode="wb", suffix=".yaml", delete=False) as tmp:
+        yaml_path = tmp.name
+        tmp.write(b"id: 1\x00\ntime_taken: 3\nexec_code: print(\x04'a\x7f')\n")
+
+    test_case = TestCase.load_from_file(yaml_path, None)
+    assert test_case.id == 1
+    assert test_case.exec_code == "print('a')"
+    os.unlink(yaml_path)
+
+
+def test_usage_saved_as_mapping():
+    """The usage should be saved as a YAML mapping and restored as Usage objects"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.makedirs(os.path.join(temp_dir, "queue"), exist_ok=True)
+        test_case = TestCase(id=1, states=[TestcaseState.SUMMARIZE])
+        test_case._out_dir = temp_dir
+        usage = Usage(model="gpt-4o", call_cnt=1, cost=0.5, input_tokens=10)
+        test_case.add_usage({"TOTAL": usage, "think": usage})
+        test_case.save_to_disk()
+
+        yaml_file = os.path.join(temp_dir, "queue", "id:000001.yaml")
+        with open(yaml_file) as f:
+            content = f.read()
+        assert "usage:\n  TOTAL:\n    model: gpt-4o\n" in content
+
+        loaded = TestCase.load_from_file(yaml_file, temp_dir)
+        assert loaded.usage["TOTAL"].cost == 0.5
+        assert loaded.usage["SUMMARIZE"]["think"].input_tokens == 10
+
+
+def test_write_to_yaml_file_is_atomic():
+    """A failed write should keep the previous file and leave no temporary files"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        yaml_path = os.path.join(temp_dir, "id:000001.yaml")
+        test_case = TestCase(id=1)
+        test_case.write_to_yaml_file(yaml_path, lambda f: f.write("id: 1\n"))
+
+        def failing_write(f):
+            f.write("id: 2\n")
+            raise RuntimeError("serialization failed")
+
+        try:
+            test_case.write_to_yaml_file(yaml_path, failing_write)
+        except RuntimeError:
+            pass
+
+        with open(yaml_path) as f:
+            assert f.read() == "id: 1\n"
+        assert os.listdir(temp_dir) == ["id:000001.yaml"]
+
+
+def test_dump_ruamel_strings_with_pyyaml():
+    """Strings loaded by ruamel should be dumped by the libyaml dumper"""
+    yaml_instance = create_yaml_instance()
+    data = yaml_instance.load("code: |\n  a\n  b\nname: test\n")
+    test_case = TestCase(id=1, exec_code=data["code"], justification=data["name"])
+    assert "exec_code: |\n  a\n  b\n" in pyyaml.dump(
+        test_case.to_dict(), Dumper=_C_DUMPER, sort_keys=False
+    )
+
+
+def test_scheduling_information_is_cached(monkeypatch):
+    """Scheduling information is rebuilt only when coverage or history changes"""
+    compressed = []
+    monkeypatch.setattr(
+        testcase_module,
+        "trace_compress",
+        lambda trace: compressed.append(trace) or [],
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        tc = manager.add_initial_testcase("print('seed')", "trace", "summary", 1)
+
+        info, weight = manager.get_test_case_scheduling_information(tc.id)
+        assert manager.get_test_case_scheduling_information(tc.id) == (info, weight)
+        assert len(compressed) == 1
+
+        tc.selected_cnt += 1
+        info, _ = manager.get_test_case_scheduling_information(tc.id)
+        assert "1/1(100.0%)" in info
+        assert len(compressed) == 2
+
+        Coverage.get_instance().epoch += 1
+        manager.get_test_case_scheduling_information(tc.id)
+        assert len(compressed) == 3
+
+
+def test_scheduling_information_truncated_by_token_limit(monkeypatch):
+    """Test cases beyond the token limit are dropped, counting each one only once"""
+    counted = []
+    monkeypatch.setattr(
+        testcase_module,
+        "estimate_text_token",
+        lambda text: counted.append(text) or len(text),
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        for _ in range(3):
+            manager.add_initial_testcase("x" * 70000, "", "summary", 1)
+
+        assert list(manager.get_all_scheduling_information()) == [2, 1]
+        # the whole prompt, then the reminder and each test case separately
+        assert len(counted) == 5
+
+
+def test_scheduling_information_counts_tokens_once(monkeypatch):
+    """Under the token limit, the whole prompt is counted with a single request"""
+    counted = []
+    monkeypatch.setattr(
+        testcase_module,
+        "estimate_text_token",
+        lambda text: counted.append(text) or len(text),
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        for _ in range(3):
+            manager.add_initial_testcase("print('seed')", "", "summary", 1)
+
+        assert list(manager.get_all_scheduling_information()) == [0, 1, 2]
+        assert len(counted) == 1
+
+
+def test_scheduling_information_long_call_chain(monkeypatch):
+    """Long call chains only show the functions with the lowest coverage"""
+    chain = [("a.c", f"f{i}", [1]) for i in range(40)]
+    monkeypatch.setattr(testcase_module, "trace_compress", lambda trace: chain)
+
+    class FakeFileCoverage:
+        def get_function_cov(self, func_name, blocks):
+            # odd functions are fully covered, even ones are not covered at all
+            covered = int(func_name[1:]) % 2
+            return (covered, 1), (1, 1)
+
+    monkeypatch.setattr(
+        Coverage.get_instance(), "get_file_coverage", lambda path: FakeFileCoverage()
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        tc = manager.add_initial_testcase("print('seed')", "trace", "summary", 1)
+        info, _ = manager.get_test_case_scheduling_information(tc.id)
+
+    assert "The call chain is with 40 funcs" in info
+    # first, the uncovered functions in the middle and last
+    shown = ["f0"] + [f"f{i}" for i in range(2, 37, 2)] + ["f39"]
+    assert info.count("a.c[") == len(shown)
+    for func_name in shown:
+        assert f"a.c[{func_name} (" in info
+    assert "a.c[f36 (0%)][100%]=>[..2 funcs omitted..]=>a.c[f39 (100%)][100%]" in info
+
+
+def test_scheduling_information_valuable_testcases(monkeypatch):
+    """Only valuable test cases are scheduled, once they are finished"""
+    monkeypatch.setattr(testcase_module, "estimate_text_token", len)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        manager.add_initial_testcase("print('seed')", "", "summary", 1)
+
+        def create(branch):
+            return manager.create_new_testcase(
+                0, "summary", branch, "why", ("a.c", (1, 2)), None, "x > 0"
+            )
+
+        reached = create("branch a")
+        not_reached = create("branch b")
+        not_reached.add_state(TestcaseState.FINISHED)
+        assert list(manager.get_all_scheduling_information()) == [0]
+
+        reached.exec_code = "print('reached')"
+        reached.execution_trace = ""
+        reached.is_target_covered = True
+        reached.add_state(TestcaseState.FINISHED)
+        assert list(manager.get_all_scheduling_information()) == [0, 1]
+
+        loaded = TestCaseManager(temp_dir)
+        manager.save_all_testcases()
+        loaded.load_testcases(temp_dir)
+        assert list(loaded.get_all_scheduling_information()) == [0, 1]
+
+
+def test_get_max_time_taken():
+    """The maximum time taken is 0 without any test case"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = TestCaseManager(temp_dir)
+        assert manager.get_max_time_taken() == 0
+        manager.add_initial_testcase("print('seed')", "", "summary", 1)
+        manager.get_testcase(0).time_taken = 42
+        assert manager.get_max_time_taken() == 42
+
+
+def test_ceil_percentage():
+    """Percentages are rounded up without floating point errors"""
+    assert _ceil_percentage(0, 3) == 0
+    assert _ceil_percentage(1, 3) == 34
+    assert _ceil_percentage(7, 100) == 7
+    assert _ceil_percentage(3, 3) == 100
+
+
+def test_select_lowest_coverage_indices():
+    """The first, last and lowest covered functions are selected in chain order"""
+    line_covs = [(5, 10), (1, 10), (9, 10), (0, 10), (2, 10), (1, 10), (10, 10)]
+    assert _select_lowest_coverage_indices(line_covs, 5) == [0, 1, 3, 5, 6]
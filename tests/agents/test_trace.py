@@ -18,3 +18,19 @@ def test_init():
         if os.path.isfile(file_path):
             trace_collector = TraceCollector(file_path)
             assert trace_collector is not None
+
+
+def test_get_function_cov(tmp_path):
+    """get_function_cov matches the separate line and block coverage methods"""
+    file_path = tmp_path / "test_file.py"
+    file_path.write_text(
+        "import sys\n\ndef test_function(x):\n    sys.stderr.write('enter test_function 1')\n    if x:\n        sys.stderr.write('enter test_function 2')\n        print('x')\n        sys.stderr.write('exit test_function 2')\n    print('done')\n    sys.stderr.write('exit test_function 1')\n"
+    )
+    trace_collector = TraceCollector(str(file_path))
+    trace_collector.collect_trace("enter test_function 1\nexit test_function 1\n")
+
+    for blocks in ([1], [1, 2], []):
+        assert trace_collector.get_function_cov("test_function", blocks) == (
+            trace_collector.get_function_line_cov("test_function"),
+            trace_collector.get_exec_block_cov("test_function", blocks),
+        )